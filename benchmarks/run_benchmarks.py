@@ -0,0 +1,304 @@
+"""
+Benchmark the pipeline on synthetic data (see synthetic_data.py) at several scales.
+
+For every scale it times reading and cleaning each raw table, each dimension and fact
+builder, the whole `transform_data` call and the loader, and writes the results with the
+commit they were measured on to benchmarks/results/. The loader runs against SQLite
+(see sqlite_standin.py) unless a MySQL connection is given.
+
+    python -m benchmarks.run_benchmarks --scales 1000 100000 1000000
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from scripts.loading.load import DEFAULT_BATCH_SIZE, DEFAULT_COMMIT_EVERY, insert_chunks, iter_dataframe_chunks, load_tables_to_mysql
+from scripts.storage import STORAGE_FORMATS, list_tables
+from scripts.transformation.data_transformation_helpers import TABLE_TRANSFORMS
+from scripts.transformation.dim_fact_creation import DIMENSION_BUILDERS, FACT_BUILDERS, STAR_SCHEMA_NODES
+from scripts.transformation.projection import needed_columns
+from scripts.transformation.transform import read_raw_table, transform_data
+
+from .sqlite_standin import SQLiteConnection
+from .synthetic_data import generate_raw_data
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARK_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+DEFAULT_SCALES = [1000, 10000, 100000]
+
+# Share by which a step must slow down to be flagged by --compare
+REGRESSION_THRESHOLD = 0.10
+
+SURROGATE_KEY_COLUMNS = ['ProductKey', 'SupplierKey', 'CustomerKey', 'WarehouseKey', 'TimeKey']
+
+
+def git_commit():
+    """Commit of the working tree, marked '-dirty' when it has uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCHMARK_DIR, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if status else commit
+
+
+def machine_info():
+    """What a result depends on besides the code."""
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def measure(func, repeat):
+    """
+    Run `func` `repeat` times.
+
+    Returns:
+    - tuple: (median seconds, fastest seconds, result of the last run)
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds), min(seconds), result
+
+
+def row_count(value):
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+
+def raw_data_dir(scale, seed, storage_format):
+    """Directory of the generated raw tables of a scale, generated on first use."""
+    directory = os.path.join(DATA_DIR, f"scale-{scale}-seed-{seed}-{storage_format}")
+    if not os.path.isdir(directory) or not list_tables(directory, storage_format):
+        generate_raw_data(directory, scale, seed, storage_format)
+    return directory
+
+
+def benchmark_transforms(raw_dir, storage_format, repeat, record):
+    """Time reading and cleaning every raw table; returns the cleaned tables."""
+    projection = needed_columns()
+    cleaned = {}
+    for table_name in list_tables(raw_dir, storage_format):
+        columns = projection.get(table_name)
+        median, fastest, raw = measure(lambda: read_raw_table(raw_dir, table_name, storage_format, columns), repeat)
+        record(f"read:{table_name}", median, fastest, None, len(raw))
+
+        median, fastest, cleaned[table_name] = measure(lambda: TABLE_TRANSFORMS[table_name](raw), repeat)
+        record(f"transform:{table_name}", median, fastest, len(raw), len(cleaned[table_name]))
+    return cleaned
+
+
+def benchmark_builders(cleaned, repeat, record):
+    """Time every dimension and fact builder on the cleaned tables; returns the star schema."""
+    star_tables = {}
+    for name, node in STAR_SCHEMA_NODES.items():
+        rows_in = sum(len(cleaned[table_name]) for table_name in node['tables'])
+        if name in DIMENSION_BUILDERS:
+            def build():
+                return DIMENSION_BUILDERS[name](cleaned, dict.fromkeys(SURROGATE_KEY_COLUMNS, 0))[0]
+        else:
+            def build():
+                return FACT_BUILDERS[name](cleaned, *[star_tables[dim] for dim in node['depends_on']])
+
+        median, fastest, star_tables[name] = measure(build, repeat)
+        record(f"build:{name}", median, fastest, rows_in, len(star_tables[name]))
+    return star_tables
+
+
+def load_into_sqlite(star_tables, directory, batch_size, commit_every):
+    """Load every star-schema table into a fresh SQLite file with the loader's insert path."""
+    conn = SQLiteConnection(os.path.join(directory, f"warehouse-{time.perf_counter_ns()}.sqlite"))
+    try:
+        cursor = conn.cursor()
+        rows = {
+            table_name: insert_chunks(
+                conn, cursor, table_name, iter_dataframe_chunks(df, batch_size), batch_size, commit_every, table_name
+            )
+            for table_name, df in star_tables.items()
+        }
+        cursor.close()
+    finally:
+        conn.close()
+    return rows
+
+
+def benchmark_load(star_tables, repeat, record, batch_size, commit_every, mysql_config=None):
+    """Time the loader against SQLite, or against MySQL when `mysql_config` is given."""
+    rows_in = sum(len(df) for df in star_tables.values())
+
+    if mysql_config is not None:
+        median, fastest, _ = measure(
+            lambda: load_tables_to_mysql(mysql_config, star_tables, batch_size, commit_every, mode='swap'), repeat
+        )
+        record('load:mysql', median, fastest, rows_in, rows_in)
+        return
+
+    directory = tempfile.mkdtemp(prefix='estore-bench-')
+    try:
+        for table_name, df in star_tables.items():
+            median, fastest, rows = measure(
+                lambda: load_into_sqlite({table_name: df}, directory, batch_size, commit_every), repeat
+            )
+            record(f"load:{table_name}", median, fastest, len(df), rows[table_name])
+
+        median, fastest, _ = measure(lambda: load_into_sqlite(star_tables, directory, batch_size, commit_every), repeat)
+        record('load:sqlite', median, fastest, rows_in, rows_in)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_benchmarks(scales, repeat=3, seed=0, storage_format='csv', workers=1, build_workers=1,
+                   batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY, mysql_config=None, skip_load=False):
+    """
+    Benchmark every step of the pipeline at each scale (number of sales orders).
+
+    Each step runs `repeat` times; its median and fastest time are kept.
+
+    Returns:
+    - dict: the report, with the commit, machine, settings and one result per (scale, step)
+    """
+    results = []
+
+    for scale in scales:
+        raw_dir = raw_data_dir(scale, seed, storage_format)
+        print(f"Scale {scale}: {raw_dir}")
+
+        def record(step, median, fastest, rows_in, rows_out):
+            results.append({
+                'scale': scale, 'step': step, 'seconds': median, 'min_seconds': fastest,
+                'rows_in': rows_in, 'rows_out': rows_out,
+            })
+            print(f"  {step:<32} {median:9.4f}s  rows {rows_in if rows_in is not None else '-'} -> {rows_out}")
+
+        cleaned = benchmark_transforms(raw_dir, storage_format, repeat, record)
+        star_tables = benchmark_builders(cleaned, repeat, record)
+
+        median, fastest, (tables, _) = measure(
+            lambda: transform_data(
+                raw_dir, None, dict.fromkeys(SURROGATE_KEY_COLUMNS, 0), storage_format,
+                workers=workers, build_workers=build_workers
+            ),
+            repeat
+        )
+        record('transform_data', median, fastest, None, sum(len(df) for df in tables.values()))
+
+        if not skip_load:
+            benchmark_load(star_tables, repeat, record, batch_size, commit_every, mysql_config)
+
+    return {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'settings': {
+            'scales': scales, 'repeat': repeat, 'seed': seed, 'storage_format': storage_format,
+            'workers': workers, 'build_workers': build_workers, 'batch_size': batch_size,
+            'commit_every': commit_every, 'loader': 'mysql' if mysql_config is not None else 'sqlite',
+        },
+        'results': results,
+    }
+
+
+def save_report(report, directory=RESULTS_DIR):
+    """Write a benchmark report as JSON, named after its date and commit, and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = report['created'].replace(':', '').replace('-', '')
+    path = os.path.join(directory, f"{stamp}-{(report['commit'] or 'unknown')[:12]}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved at {path}")
+    return path
+
+
+def compare_reports(old_path, new_path, threshold=REGRESSION_THRESHOLD):
+    """
+    Print the change of every step measured in both reports (matched by scale and step).
+
+    Returns:
+    - list: (scale, step) of the steps that slowed down by more than `threshold`
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{old['commit']} -> {new['commit']}")
+    if old['machine'] != new['machine'] or old['settings'] != new['settings']:
+        print("Warning: the reports were measured on different machines or with different settings")
+
+    old_results = {(result['scale'], result['step']): result for result in old['results']}
+    regressions = []
+    for result in new['results']:
+        key = (result['scale'], result['step'])
+        if key not in old_results or not old_results[key]['seconds']:
+            continue
+        ratio = result['seconds'] / old_results[key]['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  SLOWER'
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f"  {key[0]:>9} {key[1]:<32} {old_results[key]['seconds']:9.4f}s -> {result['seconds']:9.4f}s "
+              f"(x{ratio:.2f}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL pipeline on synthetic data.")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help="Numbers of sales orders")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', default='csv', choices=sorted(STORAGE_FORMATS))
+    parser.add_argument('--workers', type=int, default=1, help="transform_data worker processes")
+    parser.add_argument('--build-workers', type=int, default=1, help="transform_data builder threads")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--commit-every', type=int, default=DEFAULT_COMMIT_EVERY)
+    parser.add_argument('--mysql-config', help="JSON file with DB_HOST/DB_NAME/DB_USER/DB_PASSWORD/DB_PORT of a "
+                                               "scratch MySQL database to load into instead of SQLite")
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--output', default=RESULTS_DIR, help="Directory the JSON results are written to")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two saved results instead")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare_reports(*args.compare)
+        raise SystemExit(1 if regressions else 0)
+
+    mysql_config = None
+    if args.mysql_config:
+        with open(args.mysql_config) as f:
+            mysql_config = json.load(f)
+
+    report = run_benchmarks(
+        args.scales, args.repeat, args.seed, args.format, args.workers, args.build_workers,
+        args.batch_size, args.commit_every, mysql_config, args.skip_load
+    )
+    save_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+SQLite stand-in for the MySQL warehouse, so the loader can be benchmarked without a server.
+
+The adapter only translates PyMySQL's %s placeholders into SQLite's ?; the loader's own
+DDL (backquoted identifiers, STAR_SCHEMA column types) is accepted by SQLite as is.
+Timings cover the loader's work (chunking, row conversion, batching) and an embedded
+database, not the network and server cost of a real MySQL load.
+"""
+import sqlite3
+import pandas as pd
+
+# Dates reach the driver as Timestamps, which sqlite3 does not know how to bind
+sqlite3.register_adapter(pd.Timestamp, lambda ts: ts.isoformat(sep=' '))
+
+
+class SQLiteCursor:
+    """DB-API cursor accepting PyMySQL-style %s placeholders."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=None):
+        return self.cursor.execute(query.replace('%s', '?'), params or ())
+
+    def executemany(self, query, rows):
+        return self.cursor.executemany(query.replace('%s', '?'), rows)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def close(self):
+        self.cursor.close()
+
+
+class SQLiteConnection:
+    """DB-API connection handing out `SQLiteCursor`s."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self):
+        return SQLiteCursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,220 @@
+"""
+Synthetic eStore source data at any scale, for benchmarking the pipeline.
+
+Every table is bootstrapped from the sample in data/raw: rows are drawn from the sample
+with replacement, so text, dates, amounts and the share of missing values look like the
+real extract, and the keys are then renumbered so every foreign key points at an existing
+row. On top of that a share of duplicate primary keys and of null keys is injected, which
+the cleaning step has to remove.
+
+    python -m benchmarks.synthetic_data data/synthetic --scale 100000
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+from scripts.storage import STORAGE_FORMATS, list_tables, read_table, write_table
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'raw')
+
+# Rows of each master-data table per sales order, and the minimum number of rows
+MASTER_SIZES = {
+    'category': (0, 20),
+    'location': (0.00001, 10),
+    'department': (0, 10),
+    'employee': (0.0001, 10),
+    'manufacturer': (0.0001, 10),
+    'supplier': (0.0005, 10),
+    'warehouse': (0.00001, 10),
+    'product': (0.01, 40),
+    'customer': (0.25, 500),
+}
+
+# Foreign keys of the master-data tables: column -> referenced table
+MASTER_REFERENCES = {
+    'department': {'managerid': 'employee', 'locationid': 'location'},
+    'employee': {'departmentid': 'department', 'managerid': 'employee'},
+    'product': {'categoryid': 'category', 'manufacturerid': 'manufacturer'},
+    'warehouse': {'locationid': 'location', 'managerid': 'employee'},
+}
+
+# Average number of lines per header row of the detail tables
+LINES_PER_ORDER = {
+    'salesorderdetail': 3,
+    'purchaseorderdetail': 4,
+    'returndetail': 1.5,
+    'shipmentdetail': 2,
+    'inventory': 2,     # warehouses stocking each product
+}
+
+# Primary key of every table; duplicates and null keys are injected on these
+PRIMARY_KEYS = {
+    'category': ['categoryid'],
+    'customer': ['customerid'],
+    'department': ['departmentid'],
+    'employee': ['employeeid'],
+    'inventory': ['productid', 'warehouseid'],
+    'location': ['locationid'],
+    'manufacturer': ['manufacturerid'],
+    'payment': ['paymentid'],
+    'product': ['productid'],
+    'purchaseorder': ['orderid'],
+    'purchaseorderdetail': ['orderid', 'productid'],
+    'returndetail': ['returnid', 'productid'],
+    'returns': ['returnid'],
+    'salesorder': ['orderid'],
+    'salesorderdetail': ['orderid', 'productid'],
+    'shipment': ['shipmentid'],
+    'shipmentdetail': ['shipmentid', 'productid'],
+    'supplier': ['supplierid'],
+    'warehouse': ['warehouseid'],
+}
+
+
+def bootstrap(sample, n, rng):
+    """`n` rows drawn from `sample` with replacement."""
+    return sample.iloc[rng.integers(0, len(sample), n)].reset_index(drop=True)
+
+
+def references(n, parent_rows, rng):
+    """`n` random keys of a parent table numbered 1..parent_rows."""
+    return rng.integers(1, parent_rows + 1, n)
+
+
+def detail_keys(parent_rows, child_rows, lines, rng):
+    """
+    Keys of a detail table: each parent gets 1..2*`lines`-1 distinct children.
+
+    Returns:
+    - tuple: (parent keys, child keys), with unique (parent, child) pairs
+    """
+    counts = rng.integers(1, max(2, round(2 * lines)), parent_rows)
+    counts = np.minimum(counts, child_rows)
+    parents = np.repeat(np.arange(1, parent_rows + 1), counts)
+
+    # Consecutive children (modulo the child table) from a random start, so they never repeat in a parent
+    line = np.arange(len(parents)) - np.repeat(np.cumsum(counts) - counts, counts)
+    children = (np.repeat(rng.integers(0, child_rows, parent_rows), counts) + line) % child_rows + 1
+    return parents, children
+
+
+def inject_dirty_keys(df, primary_key, duplicate_rate, null_key_rate, rng):
+    """Append copies of existing keys and blank out some keys, like a source without constraints."""
+    duplicates = df.iloc[rng.integers(0, len(df), int(len(df) * duplicate_rate))]
+    df = pd.concat([df, duplicates], ignore_index=True)
+
+    for col in primary_key:
+        df[col] = df[col].astype('Int64')
+    null_rows = rng.random(len(df)) < null_key_rate
+    df.loc[null_rows, primary_key[-1]] = pd.NA
+    return df
+
+
+def generate_tables(scale, seed=0, duplicate_rate=0.01, null_key_rate=0.001, sample_dir=SAMPLE_DIR):
+    """
+    Generate the 19 raw eStore tables for `scale` sales orders.
+
+    The other tables grow with it (see MASTER_SIZES and LINES_PER_ORDER): e.g. 1M sales
+    orders come with ~3M order lines, 250k customers and 10k products. The same scale and
+    seed always give the same data, so benchmark runs on different commits are comparable.
+
+    Returns:
+    - dict: {table name: DataFrame} with the columns of the sample tables
+    """
+    rng = np.random.default_rng(seed)
+    samples = {table_name: read_table(sample_dir, table_name) for table_name in list_tables(sample_dir)}
+    tables = {}
+
+    def from_sample(table_name, n, **columns):
+        df = bootstrap(samples[table_name], n, rng)
+        for col, values in columns.items():
+            df[col] = values
+        return df[samples[table_name].columns]
+
+    def size(table_name):
+        return len(tables[table_name])
+
+    # Master data, keys numbered from 1
+    for table_name, (per_order, minimum) in MASTER_SIZES.items():
+        n = max(minimum, int(scale * per_order))
+        tables[table_name] = from_sample(table_name, n, **{PRIMARY_KEYS[table_name][0]: np.arange(1, n + 1)})
+
+    for table_name, columns in MASTER_REFERENCES.items():
+        for col, parent in columns.items():
+            tables[table_name][col] = references(size(table_name), size(parent), rng)
+
+    # Orders and their lines
+    tables['salesorder'] = from_sample(
+        'salesorder', scale, orderid=np.arange(1, scale + 1), customerid=references(scale, size('customer'), rng)
+    )
+    purchase_orders = max(1, scale // 5)
+    tables['purchaseorder'] = from_sample(
+        'purchaseorder', purchase_orders, orderid=np.arange(1, purchase_orders + 1),
+        supplierid=references(purchase_orders, size('supplier'), rng)
+    )
+
+    # One payment and one shipment per sales order; returns for 10% of them, by the ordering customer
+    tables['payment'] = from_sample('payment', scale, paymentid=np.arange(1, scale + 1), orderid=np.arange(1, scale + 1))
+    tables['shipment'] = from_sample(
+        'shipment', scale, shipmentid=np.arange(1, scale + 1), orderid=np.arange(1, scale + 1),
+        warehouseid=references(scale, size('warehouse'), rng)
+    )
+    returns = max(1, scale // 10)
+    returned_orders = rng.choice(scale, returns, replace=False) + 1
+    tables['returns'] = from_sample(
+        'returns', returns, returnid=np.arange(1, returns + 1), orderid=returned_orders,
+        customerid=tables['salesorder']['customerid'].to_numpy()[returned_orders - 1]
+    )
+
+    details = {
+        'salesorderdetail': ('salesorder', 'orderid', 'product', 'productid'),
+        'purchaseorderdetail': ('purchaseorder', 'orderid', 'product', 'productid'),
+        'returndetail': ('returns', 'returnid', 'product', 'productid'),
+        'shipmentdetail': ('shipment', 'shipmentid', 'product', 'productid'),
+        'inventory': ('product', 'productid', 'warehouse', 'warehouseid'),
+    }
+    for table_name, (parent, parent_key, child, child_key) in details.items():
+        parents, children = detail_keys(size(parent), size(child), LINES_PER_ORDER[table_name], rng)
+        tables[table_name] = from_sample(table_name, len(parents), **{parent_key: parents, child_key: children})
+
+    # Dirty keys last, so no foreign key was drawn from a duplicate or a null
+    for table_name, df in tables.items():
+        tables[table_name] = inject_dirty_keys(df, PRIMARY_KEYS[table_name], duplicate_rate, null_key_rate, rng)
+
+    return tables
+
+
+def write_tables(tables, directory, fmt='csv'):
+    """Write generated tables to `directory` and return the number of rows written."""
+    os.makedirs(directory, exist_ok=True)
+    for table_name, df in tables.items():
+        write_table(df, directory, table_name, fmt)
+    return sum(len(df) for df in tables.values())
+
+
+def generate_raw_data(directory, scale, seed=0, fmt='csv', **rates):
+    """Generate the raw tables for `scale` sales orders into `directory` (see `generate_tables`)."""
+    rows = write_tables(generate_tables(scale, seed, **rates), directory, fmt)
+    print(f"Generated {rows} rows for {scale} sales orders in {directory}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic raw eStore tables.")
+    parser.add_argument('directory', help="Directory the raw tables are written to")
+    parser.add_argument('--scale', type=int, default=10000, help="Number of sales orders")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', default='csv', choices=sorted(STORAGE_FORMATS))
+    parser.add_argument('--duplicate-rate', type=float, default=0.01, help="Share of rows repeating a primary key")
+    parser.add_argument('--null-key-rate', type=float, default=0.001, help="Share of rows with a null key")
+    args = parser.parse_args()
+
+    generate_raw_data(
+        args.directory, args.scale, args.seed, args.format,
+        duplicate_rate=args.duplicate_rate, null_key_rate=args.null_key_rate
+    )
+
+
+if __name__ == '__main__':
+    main()
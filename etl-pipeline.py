@@ -1,7 +1,15 @@
 from scripts.extraction.extract import extract_data
 from scripts.transformation.transform import transform_data
-from scripts.loading.load import load_csv_to_mysql
+from scripts.transformation.dim_fact_creation import STAR_SCHEMA_NODES
+from scripts.transformation.key_store import KEYED_DIMENSIONS, open_key_store
+from scripts.transformation.projection import needed_columns
+from scripts.loading.load import load_csv_to_mysql, load_tables_to_mysql
 from scripts.metadata import *
+from scripts.profiling import (
+    PROFILE_DIR_ENV, PROFILE_ENV, PROFILE_MODES, configure_profiling, settings_from_env, warn_unmatched_steps
+)
+from scripts.run_report import finish_run_report, print_run_report, report_step, save_run_report, start_run_report
+import argparse
 import os
 
 src_db_config = {
@@ -22,11 +30,79 @@ db_config = {
 }
 
 
+extract_config = {
+    'ENGINE': 'pandas',     # 'pandas' or 'copy' (COPY ... TO STDOUT straight into data/raw; booleans come out as t/f)
+    'BATCH_SIZE': 50000,    # Rows per server-side cursor fetch; None fetches each table in one go
+    'WORKERS': 4,           # Tables extracted in parallel, one pooled connection each
+    'MODE': 'full',         # 'full' re-extracts every table, 'incremental' only pulls rows past each table's watermark
+    'PROJECTION': True,     # Only extract the tables and columns the transforms and dimension/fact builders read
+    'WATERMARK_COLUMNS': {  # Updated-at column or monotonically increasing key per incremental table
+        'salesorder': 'orderid',
+        'salesorderdetail': 'orderid',
+        'purchaseorder': 'orderid',
+        'purchaseorderdetail': 'orderid',
+        'payment': 'paymentid',
+        'returns': 'returnid',
+        'returndetail': 'returnid',
+        'shipment': 'shipmentid',
+        'shipmentdetail': 'shipmentid',
+    },
+    'WATERMARK_GROUPS': [   # Header/detail tables sharing one high watermark, so no detail row outruns its header
+        ['salesorder', 'salesorderdetail'],
+        ['purchaseorder', 'purchaseorderdetail'],
+        ['returns', 'returndetail'],
+        ['shipment', 'shipmentdetail'],
+    ],
+}
+
+
+transform_config = {
+    'SAVE_OUTPUT': False,       # Also write the star-schema tables to data/transformed (for audit/debug)
+    'WORKERS': 4,               # Raw tables transformed in parallel, one process each
+    'BUILD_WORKERS': 4,         # Dimension/fact builders run in parallel (threads) once their inputs are ready
+    'CACHE': True,              # Reuse cleaned tables and star-schema tables whose raw inputs did not change
+    'CACHE_MAX_MB': 512,        # Size of data/cache; least recently used entries are evicted first
+    'KEY_STORE': True,          # Keep dimension surrogate keys stable across runs and only emit new/changed members
+    'FACT_CHUNK_SIZE': None,    # Stream the order detail tables in chunks of this many rows instead of loading them whole
+    'UNMATCHED_KEYS': {         # Fact rows whose customer/supplier/product/warehouse is not in its dimension:
+        'sales_fct': 'left',    # 'left' keeps them with a missing key, 'inner' drops them, 'error' stops the run
+        'purchase_fct': 'inner',
+        'inventory_fct': 'inner',
+        'return_fct': 'inner',
+    },
+}
+
+
+load_config = {
+    'SOURCE': 'memory',         # 'memory' loads the transformed DataFrames directly; 'files' re-reads data/transformed
+    'MODE': 'swap',             # 'swap' fully refreshes the warehouse atomically (full extraction only); 'append' adds rows (required by incremental extraction)
+    'DIMENSION_MODE': 'upsert', # Mode of the incremental dimensions (time_dim and the key-store ones), which only carry new rows
+    'BATCH_SIZE': 5000,         # Rows per multi-row INSERT (and per chunk read from disk)
+    'COMMIT_EVERY': 20,         # INSERT batches between commits; None commits once per table
+    'USE_LOAD_DATA': False,     # Use LOAD DATA LOCAL INFILE for CSV files (needs local_infile on the server)
+    'MAX_CONNECTIONS': 4,       # Tables loaded in parallel (dimensions first, then facts)
+}
+
+
+report_config = {
+    'ENABLED': True,            # Record the time, rows in/out, dropped rows and peak memory of every step of the run
+    'TRACE_MEMORY': False,      # Also trace the peak Python/NumPy memory of each step (tracemalloc; slows the run down)
+}
+
+
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 METADATA_FILE_PATH = os.path.join(PROJECT_DIR, 'metadata', 'metadata.json')
+KEY_STORE_PATH = os.path.join(PROJECT_DIR, 'metadata', 'key_store.sqlite')
+TRANSFORM_CACHE_PATH = os.path.join(PROJECT_DIR, 'data', 'cache')
 RAW_DATA_PATH = os.path.join(PROJECT_DIR, 'data', 'raw')
 TRANSFORMED_DATA_PATH = os.path.join(PROJECT_DIR, 'data', 'transformed')
+RUN_REPORT_PATH = os.path.join(PROJECT_DIR, 'metadata', 'run_report.json')
+RUN_HISTORY_PATH = os.path.join(PROJECT_DIR, 'metadata', 'run_history.jsonl')
+PROFILE_PATH = os.path.join(PROJECT_DIR, 'metadata', 'profiles')
+
+# On-disk format of data/raw and data/transformed: 'csv', 'parquet' or 'arrow' (the last two need pyarrow)
+STORAGE_FORMAT = 'csv'
 
 
 
@@ -38,27 +114,166 @@ def run_etl_pipeline():
     1. Extract data
     2. Transform data
     3. Load data
+
+    With report_config['ENABLED'], the steps of the run are written to RUN_REPORT_PATH
+    and appended to RUN_HISTORY_PATH, whether the run succeeds or fails.
+    """
+    if not report_config['ENABLED']:
+        try:
+            run_etl_stages()
+        finally:
+            warn_unmatched_steps()
+        return
+
+    start_run_report(trace_memory=report_config['TRACE_MEMORY'])
+    status = 'failed'
+    try:
+        run_etl_stages()
+        status = 'ok'
+    finally:
+        report = finish_run_report(status)
+        save_run_report(report, RUN_REPORT_PATH, RUN_HISTORY_PATH)
+        print_run_report(report)
+        warn_unmatched_steps()
+
+
+def snapshot_tables(watermark_columns):
+    """
+    Star-schema tables built only from raw tables without a watermark, which incremental runs
+    still extract in full: loading them must replace the live table rather than append to it.
+
+    Returns:
+    - list: Names of the snapshot tables.
     """
+    return [
+        name for name, node in STAR_SCHEMA_NODES.items()
+        if not any(table in watermark_columns for table in node['tables'])
+    ]
+
+
+def run_etl_stages():
+    """Extract, transform and load, each stage recorded as a step of the run report."""
 
     metadata = read_metadata(METADATA_FILE_PATH)
     last_surrogates_keys = metadata['surrogate_keys']
+    watermarks = metadata.get('watermarks', {})
 
+    incremental = extract_config['MODE'] == 'incremental'
+    # Swapping in tables built from a delta would replace the warehouse history with that delta,
+    # and the facts have no primary key, so 'upsert' would not make re-loaded rows idempotent either
+    if incremental and load_config['MODE'] != 'append':
+        raise ValueError(
+            "extract_config['MODE'] = 'incremental' only extracts new rows and must be loaded with "
+            f"load_config['MODE'] = 'append', not '{load_config['MODE']}'"
+        )
+    # Without the key store every run re-emits all dimension members under new surrogate keys
+    if incremental and not transform_config['KEY_STORE']:
+        raise ValueError(
+            "extract_config['MODE'] = 'incremental' needs transform_config['KEY_STORE'] = True, "
+            "otherwise the dimensions are loaded again with new surrogate keys on every run"
+        )
 
     print("Starting data extraction...")
-    extract_data(src_db_config,RAW_DATA_PATH)
+    with report_step('extract') as step:
+        extraction_report = extract_data(
+            src_db_config, RAW_DATA_PATH,
+            batch_size=extract_config['BATCH_SIZE'],
+            workers=extract_config['WORKERS'],
+            # Full runs record the watermarks too, so a later incremental run starts after them
+            watermark_columns=extract_config['WATERMARK_COLUMNS'],
+            watermarks=watermarks,
+            incremental=incremental,
+            watermark_groups=extract_config['WATERMARK_GROUPS'],
+            engine=extract_config['ENGINE'],
+            storage_format=STORAGE_FORMAT,
+            projection=needed_columns() if extract_config['PROJECTION'] else None
+        )
+        step['rows_out'] = sum(result['rows'] for result in extraction_report.values())
+
+    failed_tables = [table for table, result in extraction_report.items() if result['status'] != 'ok']
+    if failed_tables:
+        raise RuntimeError(f"Extraction failed for tables: {', '.join(sorted(failed_tables))}")
     
-    print("Starting data transformation...")
+    # The key store only keeps this run's keys once the load has succeeded
+    key_store = open_key_store(KEY_STORE_PATH) if transform_config['KEY_STORE'] else None
+    # time_dim only carries the days added to the calendar, like the key-store dimensions only carry new/changed members
+    incremental_dims = ['time_dim'] + (list(KEYED_DIMENSIONS) if key_store else [])
+    table_modes = {name: load_config['DIMENSION_MODE'] for name in incremental_dims}
+    if incremental:
+        # Tables built only from unwatermarked tables (e.g. inventory_fct) are full snapshots every run
+        for name in snapshot_tables(extract_config['WATERMARK_COLUMNS']):
+            table_modes.setdefault(name, 'swap')
 
-    last_surrogates_keys = transform_data(RAW_DATA_PATH, TRANSFORMED_DATA_PATH, last_surrogates_keys)
+    try:
+        print("Starting data transformation...")
 
-    
-    print("Loading data into MySQL database...")
-    load_csv_to_mysql(db_config, TRANSFORMED_DATA_PATH)
+        # Loading from files needs the transformed tables on disk
+        save_output = transform_config['SAVE_OUTPUT'] or load_config['SOURCE'] == 'files'
+        with report_step('transform'):
+            star_tables, last_surrogates_keys = transform_data(
+                RAW_DATA_PATH, TRANSFORMED_DATA_PATH if save_output else None, last_surrogates_keys, STORAGE_FORMAT,
+                key_store=key_store, workers=transform_config['WORKERS'], build_workers=transform_config['BUILD_WORKERS'],
+                cache_dir=TRANSFORM_CACHE_PATH if transform_config['CACHE'] else None,
+                cache_max_bytes=transform_config['CACHE_MAX_MB'] * 1024 * 1024,
+                fact_chunk_size=transform_config['FACT_CHUNK_SIZE'],
+                unmatched_keys=transform_config['UNMATCHED_KEYS'],
+            )
 
-    update_metadata(last_surrogates_keys,METADATA_FILE_PATH)
+
+        print("Loading data into MySQL database...")
+        with report_step('load'):
+            if load_config['SOURCE'] == 'memory':
+                loaded = load_tables_to_mysql(
+                    db_config, star_tables,
+                    batch_size=load_config['BATCH_SIZE'],
+                    commit_every=load_config['COMMIT_EVERY'],
+                    max_connections=load_config['MAX_CONNECTIONS'],
+                    mode=load_config['MODE'],
+                    table_modes=table_modes
+                )
+            else:
+                loaded = load_csv_to_mysql(
+                    db_config, TRANSFORMED_DATA_PATH, STORAGE_FORMAT,
+                    batch_size=load_config['BATCH_SIZE'],
+                    commit_every=load_config['COMMIT_EVERY'],
+                    use_load_data=load_config['USE_LOAD_DATA'],
+                    max_connections=load_config['MAX_CONNECTIONS'],
+                    mode=load_config['MODE'],
+                    table_modes=table_modes
+                )
+
+        if not loaded:
+            raise RuntimeError("Loading into MySQL failed; surrogate keys and watermarks were not advanced")
+
+        if key_store:
+            key_store.commit()
+    finally:
+        if key_store:
+            key_store.close()
+
+    update_metadata(last_surrogates_keys,METADATA_FILE_PATH, watermarks)
 
     print("ETL Pipeline Execution Completed.")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Run the eStore ETL pipeline.")
+    parser.add_argument('--profile', nargs='+', metavar='STEP', default=[],
+                        help="Profile these steps of the run report, e.g. transform_inventory build:sales_fct 'load:*' "
+                             "(default: $ETL_PROFILE, comma-separated)")
+    parser.add_argument('--profile-mode', nargs='+', choices=PROFILE_MODES, default=['cpu'],
+                        help="cpu: cProfile .pstats per step; memory: top tracemalloc allocations per step")
+    parser.add_argument('--profile-dir', default=PROFILE_PATH, help="Directory the profiles are written to")
+    args = parser.parse_args()
+
+    if args.profile:
+        configure_profiling(args.profile, args.profile_mode, args.profile_dir)
+    elif os.environ.get(PROFILE_ENV) and not os.environ.get(PROFILE_DIR_ENV):
+        settings = settings_from_env()
+        configure_profiling(settings['steps'], settings['modes'], args.profile_dir)
+
+    run_etl_pipeline()
+
+
 if __name__ == '__main__':
-    run_etl_pipeline()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,7 +1,29 @@
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from decimal import Decimal
 import os
+import time
 import pandas as pd
 
+from ..run_report import report_step
+from ..storage import TableWriter, check_format, write_table
+
+# Number of rows pulled per round trip by the streaming (server-side cursor) mode
+DEFAULT_BATCH_SIZE = 50000
+
+# pandas dtypes for PostgreSQL type OIDs, applied when writing typed storage formats
+PG_TYPE_DTYPES = {
+    16: 'boolean',                      # bool
+    20: 'Int64', 21: 'Int64', 23: 'Int64',  # int8, int2, int4
+    700: 'float64', 701: 'float64',     # float4, float8
+    1700: 'float64',                    # numeric
+    1082: 'datetime64[ns]',             # date
+    1114: 'datetime64[ns]',             # timestamp
+    25: 'string', 1042: 'string', 1043: 'string',  # text, char, varchar
+}
+
 def connect_to_db(db_config):
     """Establish connection to the PostgreSQL database using a connection dictionary."""
     return psycopg2.connect(
@@ -12,6 +34,17 @@ def connect_to_db(db_config):
         port=db_config['DB_PORT']
     )
 
+def create_connection_pool(db_config, max_connections):
+    """Create a thread-safe pool of at most `max_connections` PostgreSQL connections."""
+    return ThreadedConnectionPool(
+        1, max_connections,
+        host=db_config['DB_HOST'],
+        dbname=db_config['DB_NAME'],
+        user=db_config['DB_USER'],
+        password=db_config['DB_PASSWORD'],
+        port=db_config['DB_PORT']
+    )
+
 def get_tables(cursor):
     """Fetch the list of all tables in the 'public' schema."""
     cursor.execute("""
@@ -21,35 +54,335 @@ def get_tables(cursor):
     """)
     return [table[0] for table in cursor.fetchall()]
 
-def fetch_and_save_table_to_csv(cursor, table_name, output_dir):
-    """Fetch data from a table and save it as a CSV file."""
-    cursor.execute(f"SELECT * FROM {table_name};")
+def get_table_columns(cursor):
+    """Fetch the columns of every table in the 'public' schema, in table order."""
+    cursor.execute("""
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+        ORDER BY table_name, ordinal_position;
+    """)
+    columns = {}
+    for table_name, column_name in cursor.fetchall():
+        columns.setdefault(table_name, []).append(column_name)
+    return columns
+
+def build_select_query(table_name, watermark_column=None, low=None, high=None, columns=None):
+    """
+    Build the SELECT used to extract a table.
+
+    With a `watermark_column`, only rows in the (low, high] window are selected;
+    a `low` of None means the table has no watermark yet and everything up to
+    `high` is extracted. With `columns`, only those columns are selected.
+
+    Returns:
+    - tuple: (query, params) ready for `cursor.execute`.
+    """
+    select = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+
+    if watermark_column is None:
+        return f"{select};", None
+
+    if low is None:
+        return f"{select} WHERE {watermark_column} <= %s;", (high,)
+
+    return f"{select} WHERE {watermark_column} > %s AND {watermark_column} <= %s;", (low, high)
+
+def get_high_watermark(cursor, table_name, watermark_column):
+    """Fetch the current maximum of a table's watermark column."""
+    cursor.execute(f"SELECT MAX({watermark_column}) FROM {table_name};")
+    return cursor.fetchone()[0]
+
+def get_high_watermarks(cursor, watermark_columns, watermark_groups=None):
+    """
+    Fetch the high watermark of every watermarked table from one snapshot of the database.
+
+    Must start a transaction (commit before calling), so all maxima are read at the same point in time.
+
+    Tables of a `watermark_groups` entry (e.g. an order header and its detail table) share
+    one bound, the lowest of their maxima, so a detail row is never extracted without its
+    header nor its header without it; the newer rows wait for the next run.
+
+    Returns:
+    - dict: {table: high watermark, or None for an empty table}
+    """
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+    highs = {
+        table_name: get_high_watermark(cursor, table_name, watermark_column)
+        for table_name, watermark_column in watermark_columns.items()
+    }
+    for group in watermark_groups or []:
+        values = [highs[table_name] for table_name in group if highs.get(table_name) is not None]
+        if values:
+            for table_name in group:
+                if table_name in highs:
+                    highs[table_name] = min(values)
+    return highs
+
+def to_watermark_value(value):
+    """Convert a watermark fetched from PostgreSQL into a JSON-serializable value."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def coerce_column_types(df, description):
+    """
+    Cast the columns of a fetched batch to the pandas dtype of their PostgreSQL type.
+
+    Typed storage formats then keep those types on disk, so later stages do not
+    have to re-infer them (dates in particular) when reading the table back.
+    """
+    for desc in description:
+        dtype = PG_TYPE_DTYPES.get(desc[1])
+        if dtype is None:
+            continue
+        if dtype.startswith('datetime64'):
+            df[desc[0]] = pd.to_datetime(df[desc[0]], errors='coerce')
+        elif dtype == 'float64':
+            df[desc[0]] = pd.to_numeric(df[desc[0]], errors='coerce')
+        else:
+            df[desc[0]] = df[desc[0]].astype(dtype)
+    return df
+
+def fetch_and_save_table_to_csv(cursor, table_name, output_dir, query=None, params=None, storage_format='csv'):
+    """Fetch data from a table and save it as a CSV file (or another storage format)."""
+    cursor.execute(query or f"SELECT * FROM {table_name};", params)
 
     columns = [desc[0] for desc in cursor.description]
     rows = cursor.fetchall()
 
     df = pd.DataFrame(rows, columns=columns)
+    if storage_format != 'csv':
+        df = coerce_column_types(df, cursor.description)
+    file_path = write_table(df, output_dir, table_name, storage_format)
+
+    print(f"Table '{table_name}' saved as {storage_format} at {file_path}")
+    return len(df)
+
+def stream_table_to_csv(conn, table_name, output_dir, batch_size=DEFAULT_BATCH_SIZE, query=None, params=None, storage_format='csv'):
+    """
+    Stream a table into a CSV file (or another storage format) through a named (server-side) cursor.
+
+    Rows are fetched `batch_size` at a time and appended to the file as they
+    arrive, so only one batch is held in memory regardless of the table size.
+    """
+    # Named cursors keep the result set on the server and only ship `itersize` rows per fetch
+    cursor = conn.cursor(name=f"extract_{table_name}")
+    cursor.itersize = batch_size
+
+    try:
+        cursor.execute(query or f"SELECT * FROM {table_name};", params)
+
+        rows = cursor.fetchmany(batch_size)
+        columns = [desc[0] for desc in cursor.description]
+        total_rows = 0
+
+        with TableWriter(output_dir, table_name, storage_format) as writer:
+            # Always write the first batch, so even an empty table gets its header
+            while True:
+                batch = pd.DataFrame(rows, columns=columns)
+                if storage_format != 'csv':
+                    batch = coerce_column_types(batch, cursor.description)
+                writer.write(batch)
+                total_rows += len(rows)
+
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+    finally:
+        cursor.close()
+
+    # End the read transaction the named cursor was opened in
+    conn.commit()
+
+    print(f"Table '{table_name}' streamed as {storage_format} at {writer.path} ({total_rows} rows)")
+    return total_rows
+
+def copy_table_to_csv(cursor, table_name, output_dir, query=None, params=None):
+    """
+    Export a table straight into a CSV file with PostgreSQL's COPY.
+
+    The server renders the CSV itself and the bytes are written to disk as they
+    arrive, skipping the row -> tuple -> DataFrame -> CSV conversions entirely.
+    Note that COPY writes booleans as 't'/'f' rather than pandas' 'True'/'False'.
+    """
     file_path = os.path.join(output_dir, f"{table_name}.csv")
-    df.to_csv(file_path, index=False)
 
-    print(f"Table '{table_name}' saved as CSV at {file_path}")
+    # COPY does not take bind parameters, so inline them safely first
+    select = cursor.mogrify(query or f"SELECT * FROM {table_name}", params).decode().rstrip().rstrip(';')
+
+    with open(file_path, 'wb') as f:
+        cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH CSV HEADER", f)
+
+    print(f"Table '{table_name}' copied as CSV at {file_path}")
+    return cursor.rowcount
+
+def extract_table(pool, table_name, output_dir, batch_size=None, watermark_column=None, watermark=None, engine='pandas',
+                  storage_format='csv', columns=None, high_watermark=None):
+    """
+    Extract a single table on a connection borrowed from the pool.
+
+    When `watermark_column` is given only rows newer than `watermark` (the value recorded
+    by the previous run, None to start from the beginning) and no newer than
+    `high_watermark` (see `get_high_watermarks`; None for an empty table) are pulled.
+
+    `engine` selects how rows reach the CSV: 'pandas' fetches them into a DataFrame
+    (streamed in batches when `batch_size` is set), 'copy' uses COPY ... TO STDOUT.
+    With `columns`, only those columns are selected.
+
+    Errors are caught and reported rather than raised so one failing table
+    does not abort a concurrent run.
+
+    Returns:
+    - dict: {'status': 'ok' | 'failed', 'seconds': float, 'rows': int, 'error': str | None},
+      plus 'watermark' (the new high watermark) for incremental tables.
+    """
+    with report_step(f"extract:{table_name}") as step:
+        started = time.perf_counter()
+        result = {}
+        conn = pool.getconn()
+
+        try:
+            cursor = conn.cursor()
+            try:
+                if watermark_column is not None:
+                    # An empty table keeps its previous watermark
+                    result['watermark'] = watermark if high_watermark is None else to_watermark_value(high_watermark)
+                    query, params = build_select_query(table_name, watermark_column, watermark, result['watermark'], columns)
+                else:
+                    query, params = build_select_query(table_name, columns=columns)
+
+                if engine == 'copy':
+                    rows = copy_table_to_csv(cursor, table_name, output_dir, query, params)
+                elif batch_size:
+                    rows = stream_table_to_csv(conn, table_name, output_dir, batch_size, query, params, storage_format)
+                else:
+                    rows = fetch_and_save_table_to_csv(cursor, table_name, output_dir, query, params, storage_format)
+            finally:
+                cursor.close()
+            conn.commit()
+            status, error = 'ok', None
+        except Exception as e:
+            if not conn.closed:
+                conn.rollback()
+            rows = 0
+            status, error = 'failed', str(e)
+            print(f"Error extracting table '{table_name}': {e}")
+        finally:
+            # Broken connections are discarded instead of being handed to the next table
+            pool.putconn(conn, close=bool(conn.closed))
+
+        result.update({'status': status, 'seconds': time.perf_counter() - started, 'rows': rows, 'error': error})
+        # Every row fetched from the source is written out
+        step['rows_in'] = step['rows_out'] = rows
+        step['status'] = status
+    return result
+
+def print_extraction_report(report):
+    """Print per-table timings and any failures of an extraction run."""
+    print("Extraction summary:")
+    for table_name, result in sorted(report.items()):
+        if result['status'] == 'ok':
+            rate = result['rows'] / result['seconds'] if result['seconds'] else 0
+            print(f"  {table_name}: {result['rows']} rows in {result['seconds']:.2f}s ({rate:,.0f} rows/s)")
+        else:
+            print(f"  {table_name}: FAILED after {result['seconds']:.2f}s ({result['error']})")
 
-def extract_data(db_config, output_dir):
+def extract_data(db_config, output_dir, batch_size=None, workers=1, watermark_columns=None, watermarks=None, engine='pandas',
+                 storage_format='csv', projection=None, incremental=True, watermark_groups=None):
     """
     Extract data from the database and save it to CSV files.
 
+    Tables are extracted concurrently by `workers` threads, each on its own pooled
+    connection. A failing table is recorded in the report and does not stop the others.
+
     Parameters:
     - db_config (dict): A dictionary containing database connection parameters.
     - output_dir (str): The directory where the CSV files will be saved.
+    - batch_size (int, optional): When set, tables are streamed through server-side
+      cursors `batch_size` rows at a time instead of being fetched in one go.
+    - workers (int): Number of tables extracted in parallel (and size of the connection pool).
+    - watermark_columns (dict, optional): Maps table names to the updated-at column or
+      monotonically increasing key used to extract them incrementally. Tables not listed
+      (or all tables, when omitted) are extracted in full.
+    - watermarks (dict, optional): Watermarks recorded by the previous run, as stored in
+      metadata.json ({table: {'column': ..., 'value': ...}}). Updated in place for every
+      watermarked table that was extracted successfully.
+    - incremental (bool): When False, watermarked tables are extracted in full, but their
+      high watermarks are still recorded, so a later incremental run starts from this one.
+    - watermark_groups (list, optional): Lists of watermarked tables sharing one high
+      watermark, e.g. [['salesorder', 'salesorderdetail']] (see `get_high_watermarks`).
+      All high watermarks are read from one snapshot before any table is extracted.
+    - engine (str): 'pandas' (default) or 'copy' to export through COPY ... TO STDOUT,
+      bypassing pandas entirely. `batch_size` only applies to the 'pandas' engine.
+    - storage_format (str): 'csv' (default), 'parquet' or 'arrow'. Typed formats keep the
+      source column types; the 'copy' engine only produces CSV.
+    - projection (dict, optional): {table: [columns], or None for every column} as returned
+      by `needed_columns`. Only these tables are extracted, and only the listed columns
+      the source table has are selected.
+
+    Returns:
+    - dict: Per-table report of the form {table: {'status', 'seconds', 'rows', 'error'}}.
     """
-    conn = connect_to_db(db_config)
-    cursor = conn.cursor()
+    if engine not in ('pandas', 'copy'):
+        raise ValueError(f"Unknown extraction engine '{engine}', expected 'pandas' or 'copy'")
+    check_format(storage_format)
+    if engine == 'copy' and storage_format != 'csv':
+        raise ValueError("The 'copy' extraction engine only writes CSV files")
+
+    watermark_columns = watermark_columns or {}
+    watermarks = {} if watermarks is None else watermarks
+    pool = create_connection_pool(db_config, workers)
+    report = {}
 
     try:
-        tables = get_tables(cursor)
-        for table in tables:
-            fetch_and_save_table_to_csv(cursor, table, output_dir)
-    
+        conn = pool.getconn()
+        try:
+            cursor = conn.cursor()
+            tables = get_tables(cursor)
+            table_columns = get_table_columns(cursor) if projection is not None else {}
+            extracted_columns = {
+                table: column for table, column in watermark_columns.items()
+                if table in tables and (projection is None or table in projection)
+            }
+            conn.commit()
+            high_watermarks = get_high_watermarks(cursor, extracted_columns, watermark_groups)
+            cursor.close()
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+
+        if projection is not None:
+            skipped = sorted(table for table in tables if table not in projection)
+            if skipped:
+                print(f"Skipping tables no transform reads: {', '.join(skipped)}")
+            tables = [table for table in tables if table in projection]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for table in tables:
+                columns = None
+                if projection is not None and projection[table] is not None:
+                    columns = [col for col in table_columns.get(table, []) if col in set(projection[table])]
+                column = watermark_columns.get(table)
+                previous = watermarks.get(table, {})
+                # A watermark recorded against a different column is meaningless; start over
+                low = previous.get('value') if incremental and previous.get('column') == column else None
+                futures[executor.submit(
+                    extract_table, pool, table, output_dir, batch_size, column, low, engine, storage_format, columns,
+                    high_watermarks.get(table)
+                )] = table
+
+            for future in as_completed(futures):
+                table = futures[future]
+                report[table] = future.result()
+                if report[table]['status'] == 'ok' and 'watermark' in report[table]:
+                    watermarks[table] = {'column': watermark_columns[table], 'value': report[table]['watermark']}
+
     finally:
-        cursor.close()
-        conn.close()
+        pool.closeall()
+
+    print_extraction_report(report)
+    return report
@@ -1,62 +1,401 @@
 import pymysql
 import pandas as pd
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
-def load_csv_to_mysql(db_config, csv_dir):
+from ..run_report import report_step
+from ..storage import iter_table_chunks, list_tables, table_path
+from .schema import STAR_SCHEMA, column_definitions, index_name
+
+# Rows sent per multi-row INSERT (and rows read per chunk from disk)
+DEFAULT_BATCH_SIZE = 5000
+
+# Number of INSERT batches between commits; None commits once per table
+DEFAULT_COMMIT_EVERY = 20
+
+# Suffixes of the shadow tables used by the 'swap' load mode
+STAGING_SUFFIX = '__staging'
+OLD_SUFFIX = '__old'
+
+LOAD_MODES = ('append', 'swap', 'upsert')
+
+def connect_to_db(db_config, local_infile=False):
+    """Establish connection to the MySQL database using a connection dictionary."""
+    return pymysql.connect(
+        host=db_config['DB_HOST'],
+        database=db_config['DB_NAME'],
+        user=db_config['DB_USER'],
+        password=db_config['DB_PASSWORD'],
+        port=db_config['DB_PORT'],
+        local_infile=local_infile
+    )
+
+def create_connection_pool(db_config, size, local_infile=False):
+    """Open `size` MySQL connections and hand them out through a thread-safe queue."""
+    pool = queue.Queue()
+    for _ in range(size):
+        pool.put(connect_to_db(db_config, local_infile=local_infile))
+    return pool
+
+def close_connection_pool(pool):
+    """Close every connection of a pool created by `create_connection_pool`."""
+    while not pool.empty():
+        pool.get_nowait().close()
+
+def load_stages(table_names):
     """
-    Load CSV files from a directory into a MySQL database.
-    Each CSV file will be loaded into a table with the same name as the file (without the .csv extension).
+    Group tables into load stages that run one after the other.
+
+    Dimensions are loaded first and facts second, so a fact table never becomes
+    visible before the dimensions it references. Any other table comes last.
     """
-    conn = None
+    dims = [name for name in table_names if name.endswith('_dim')]
+    facts = [name for name in table_names if name.endswith('_fct')]
+    others = [name for name in table_names if name not in dims and name not in facts]
+    return [stage for stage in (dims, facts, others) if stage]
 
-    try:
-        # Establish the connection to MySQL using PyMySQL
-        conn = pymysql.connect(
-            host=db_config['DB_HOST'],
-            database=db_config['DB_NAME'],
-            user=db_config['DB_USER'],
-            password=db_config['DB_PASSWORD'],
-            port=db_config['DB_PORT']
+def iter_dataframe_chunks(df, chunksize=DEFAULT_BATCH_SIZE):
+    """
+    Yield consecutive slices of at most `chunksize` rows of an in-memory DataFrame.
+
+    An empty DataFrame still yields one (empty) chunk, so its table gets created.
+    """
+    for start in range(0, max(len(df), 1), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+def to_db_rows(df):
+    """Convert a DataFrame into a list of row tuples, sending missing values (NaN/NaT) as NULL."""
+    # Periods (e.g. time_dim's Quarter) are sent the way they are written to CSV
+    periods = [col for col in df.columns if isinstance(df[col].dtype, pd.PeriodDtype)]
+    if periods:
+        df = df.astype({col: str for col in periods})
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+def create_table(cursor, table_name, columns, schema_table=None):
+    """
+    Create a table for the given DataFrame columns if it does not exist yet.
+
+    Star-schema tables get the types and primary key declared in STAR_SCHEMA;
+    their secondary indexes are added by `create_indexes` once the data is in.
+    `schema_table` names the STAR_SCHEMA entry when it differs from `table_name`
+    (e.g. for staging tables).
+    """
+    definitions = ",\n        ".join(column_definitions(schema_table or table_name, columns))
+
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{table_name}` (
+        {definitions}
+    );
+    """)
+    print(f"Table '{table_name}' created or already exists.")
+
+def check_primary_key(cursor, table_name, schema_table=None):
+    """
+    Make sure an upsert into `table_name` can replace rows by their primary key.
+
+    `CREATE TABLE IF NOT EXISTS` keeps tables created before STAR_SCHEMA declared their
+    types and keys; without the declared primary key, ON DUPLICATE KEY UPDATE and
+    REPLACE never match a row and would silently append duplicates.
+    """
+    primary_key = STAR_SCHEMA.get(schema_table or table_name, {}).get('primary_key', [])
+    if not primary_key:
+        raise ValueError(f"Table '{table_name}' has no primary key in STAR_SCHEMA and cannot be upserted")
+
+    cursor.execute(f"SHOW KEYS FROM `{table_name}` WHERE Key_name = 'PRIMARY';")
+    existing = [row[4] for row in sorted(cursor.fetchall(), key=lambda row: row[3])]   # Column_name by Seq_in_index
+    if existing != primary_key:
+        raise RuntimeError(
+            f"Table '{table_name}' has primary key {existing or 'none'} instead of {primary_key}, so an upsert "
+            f"would append duplicates; drop the table (or add the key) and reload it"
         )
 
-        if conn.open:
-            print(f"Connected to MySQL database {db_config['DB_NAME']}")
-
-            # Loop through each CSV file in the directory
-            for file_name in os.listdir(csv_dir):
-                if file_name.endswith('.csv'):
-                    table_name = file_name.replace('.csv', '')  # Table name from file name
-                    file_path = os.path.join(csv_dir, file_name)
-                    df = pd.read_csv(file_path)
-
-                    # Prepare columns for creating table
-                    columns = ", ".join([f"`{col}` TEXT" for col in df.columns])
-
-                    # Create a table if not exists
-                    create_table_query = f"""
-                    CREATE TABLE IF NOT EXISTS `{table_name}` (
-                        {columns}
-                    );
-                    """
-                    cursor = conn.cursor()
-                    cursor.execute(create_table_query)
-                    print(f"Table '{table_name}' created or already exists.")
-
-                    # Insert data into the table
-                    for _, row in df.iterrows():
-                        insert_query = f"INSERT INTO `{table_name}` ({', '.join(df.columns)}) VALUES ({', '.join(['%s'] * len(row))})"
-                        cursor.execute(insert_query, tuple(row))
-                    conn.commit()
-                    print(f"Loaded '{file_name}' into MySQL table '{table_name}'")
-
-            cursor.close()
-        else:
-            print("Failed to connect to MySQL")
+def create_indexes(cursor, table_name, schema_table=None):
+    """
+    Add the secondary indexes declared in STAR_SCHEMA that the table does not have yet.
+
+    Called after the bulk load, so rows are not indexed one insert at a time.
+    """
+    indexes = STAR_SCHEMA.get(schema_table or table_name, {}).get('indexes', [])
+    if not indexes:
+        return
+
+    cursor.execute(f"SHOW INDEX FROM `{table_name}`;")
+    existing = {row[2] for row in cursor.fetchall()}   # Key_name
+
+    for columns in indexes:
+        name = index_name(columns)
+        if name not in existing:
+            cursor.execute(f"CREATE INDEX `{name}` ON `{table_name}` ({', '.join(f'`{col}`' for col in columns)});")
+            print(f"Index '{name}' created on '{table_name}'.")
+
+def upsert_clause(table_name, columns):
+    """
+    ON DUPLICATE KEY UPDATE clause overwriting every non-key column.
+
+    Empty when every column is part of the key; `check_primary_key` has checked the key is there.
+    """
+    primary_key = STAR_SCHEMA.get(table_name, {}).get('primary_key', [])
+    if not primary_key:
+        return ''
+    updates = [f"`{col}` = VALUES(`{col}`)" for col in columns if col not in primary_key]
+    return f" ON DUPLICATE KEY UPDATE {', '.join(updates)}" if updates else ''
+
+def insert_chunks(conn, cursor, table_name, chunks, batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY,
+                  schema_table=None, upsert=False):
+    """
+    Insert DataFrame chunks into a table with multi-row `executemany` batches.
+
+    PyMySQL rewrites `executemany` on an INSERT ... VALUES statement into a single
+    multi-row INSERT, so each batch costs one round trip instead of one per row.
+    The table is created from the columns of the first chunk. With `upsert`, rows
+    whose primary key already exists replace the stored ones.
+
+    Returns:
+    - int: Number of rows inserted.
+    """
+    insert_query = None
+    total_rows = 0
+    batches = 0
+
+    for chunk in chunks:
+        if insert_query is None:
+            create_table(cursor, table_name, chunk.columns, schema_table)
+            if upsert:
+                check_primary_key(cursor, table_name, schema_table)
+            insert_query = (
+                f"INSERT INTO `{table_name}` ({', '.join(f'`{col}`' for col in chunk.columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(chunk.columns))})"
+            )
+            if upsert:
+                insert_query += upsert_clause(schema_table or table_name, chunk.columns)
+
+        for start in range(0, len(chunk), batch_size):
+            rows = to_db_rows(chunk.iloc[start:start + batch_size])
+            cursor.executemany(insert_query, rows)
+            total_rows += len(rows)
+            batches += 1
+
+            if commit_every and batches % commit_every == 0:
+                conn.commit()
+
+    conn.commit()
+    return total_rows
+
+def load_data_infile(conn, cursor, table_name, file_path, schema_table=None, upsert=False):
+    """
+    Bulk load a CSV file with `LOAD DATA LOCAL INFILE`.
+
+    The server parses the file itself, which is the fastest way into MySQL. Empty
+    fields are loaded as NULL, like missing values on the INSERT path. Needs
+    `local_infile` enabled on both the client connection and the server.
+    With `upsert`, rows whose primary key already exists replace the stored ones.
+
+    Returns:
+    - int: Number of rows loaded.
+    """
+    columns = list(pd.read_csv(file_path, nrows=0).columns)
+    with open(file_path, 'r', newline='') as f:
+        header = f.readline()
+    line_terminator = '\\r\\n' if header.endswith('\r\n') else '\\n'
+
+    create_table(cursor, table_name, columns, schema_table)
+    if upsert:
+        check_primary_key(cursor, table_name, schema_table)
+
+    variables = [f"@col{i}" for i in range(len(columns))]
+    assignments = ", ".join(f"`{col}` = NULLIF({var}, '')" for col, var in zip(columns, variables))
+
+    cursor.execute(f"""
+    LOAD DATA LOCAL INFILE %s {'REPLACE ' if upsert else ''}INTO TABLE `{table_name}`
+    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+    LINES TERMINATED BY '{line_terminator}'
+    IGNORE 1 LINES
+    ({', '.join(variables)})
+    SET {assignments};
+    """, (os.path.abspath(file_path),))
+    conn.commit()
+
+    return cursor.rowcount
+
+def staging_table_name(table_name):
+    """Name of the shadow table a table is loaded into by the 'swap' load mode."""
+    return f"{table_name}{STAGING_SUFFIX}"
+
+def swap_tables(conn, table_names):
+    """
+    Replace live tables with their fully loaded staging tables in one atomic RENAME TABLE.
+
+    Readers see either every old table or every new one, never a partial refresh.
+    The previous versions are dropped afterwards.
+    """
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SHOW TABLES;")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        # Leftovers of an interrupted swap would block the rename
+        for table_name in table_names:
+            cursor.execute(f"DROP TABLE IF EXISTS `{table_name}{OLD_SUFFIX}`;")
+
+        renames = []
+        for table_name in table_names:
+            if table_name in existing:
+                renames.append(f"`{table_name}` TO `{table_name}{OLD_SUFFIX}`")
+            renames.append(f"`{staging_table_name(table_name)}` TO `{table_name}`")
+        cursor.execute(f"RENAME TABLE {', '.join(renames)};")
+        print(f"Swapped in {len(table_names)} refreshed tables: {', '.join(table_names)}")
+
+        for table_name in table_names:
+            cursor.execute(f"DROP TABLE IF EXISTS `{table_name}{OLD_SUFFIX}`;")
+    finally:
+        cursor.close()
+
+def load_table(pool, table_name, source, batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY, mode='append'):
+    """
+    Load one table on a connection borrowed from the pool, then build its indexes.
+
+    `source` is a DataFrame (streamed out in `batch_size` slices), an iterable of
+    DataFrame chunks, or the path of a CSV file to hand to `LOAD DATA LOCAL INFILE`.
+
+    In 'append' mode rows are added to the live table. In 'swap' mode they go into a
+    fresh staging table, which `swap_tables` later puts in place of the live one.
+    In 'upsert' mode rows are written to the live table, replacing the rows with the
+    same primary key (e.g. dimension members whose attributes changed); a live table
+    without that primary key is an error rather than a silent append.
+
+    Returns:
+    - int: Number of rows loaded.
+    """
+    conn = pool.get()
+    cursor = conn.cursor()
+    target_table = staging_table_name(table_name) if mode == 'swap' else table_name
+
+    try:
+        with report_step(f"load:{table_name}") as step:
+            if mode == 'swap':
+                cursor.execute(f"DROP TABLE IF EXISTS `{target_table}`;")
+
+            if isinstance(source, str):
+                rows = load_data_infile(conn, cursor, target_table, source, table_name, upsert=mode == 'upsert')
+            else:
+                chunks = iter_dataframe_chunks(source, batch_size) if isinstance(source, pd.DataFrame) else source
+                rows = insert_chunks(conn, cursor, target_table, chunks, batch_size, commit_every, table_name,
+                                     upsert=mode == 'upsert')
+            # Chunk iterables and files are only counted as they are loaded
+            step['rows_in'] = len(source) if isinstance(source, pd.DataFrame) else rows
+            step['rows_out'] = rows
+
+            print(f"Loaded {rows} rows of '{table_name}' into MySQL table '{target_table}'")
+
+            create_indexes(cursor, target_table, table_name)
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        pool.put(conn)
+
+def load_tables_to_mysql(db_config, tables, batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY,
+                         max_connections=1, mode='append', table_modes=None):
+    """
+    Load tables into a MySQL database.
+
+    `tables` maps table names to their source: an in-memory DataFrame (e.g. straight from
+    `transform_data`, without a CSV round trip), an iterable of DataFrame chunks, or the
+    path of a CSV file to load with `LOAD DATA LOCAL INFILE`. Rows are inserted with
+    multi-row batches of `batch_size`, committing every `commit_every` batches.
+
+    Dimension tables are loaded first, in parallel, then the fact tables, in parallel.
+    Each table is loaded on its own pooled connection; `max_connections` caps how many
+    run at the same time. If a stage fails, the following stages are not loaded.
+
+    `mode` is 'append' (add rows to the live tables) or 'swap' (full refresh: load every
+    table into a staging copy, then swap all of them in with a single atomic RENAME TABLE,
+    so reports never read a partially loaded warehouse and re-runs never duplicate rows)
+    or 'upsert' (replace rows by primary key). `table_modes` overrides `mode` for single
+    tables, e.g. to upsert the new/changed members of incrementally built dimensions.
+
+    Returns:
+    - bool: True if every table was loaded (and swapped in).
+    """
+    modes = {table_name: (table_modes or {}).get(table_name, mode) for table_name in tables}
+    for table_mode in set(modes.values()):
+        if table_mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode '{table_mode}', expected one of {LOAD_MODES}")
+
+    pool = None
+
+    try:
+        stages = load_stages(list(tables))
+        if not stages:
+            print("No tables to load")
+            return True
+
+        # Establish the connections to MySQL using PyMySQL
+        use_load_data = any(isinstance(source, str) for source in tables.values())
+        pool_size = max(1, min(max_connections, max(len(stage) for stage in stages)))
+        pool = create_connection_pool(db_config, pool_size, local_infile=use_load_data)
+        print(f"Connected to MySQL database {db_config['DB_NAME']} ({pool_size} connections)")
+
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            for stage in stages:
+                futures = {
+                    table_name: executor.submit(
+                        load_table, pool, table_name, tables[table_name], batch_size, commit_every, modes[table_name]
+                    )
+                    for table_name in stage
+                }
+
+                failed = []
+                for table_name, future in futures.items():
+                    error = future.exception()
+                    if error is not None:
+                        print(f"Error loading '{table_name}': {error}")
+                        failed.append(table_name)
+
+                if failed:
+                    print(f"Stopping the load: {', '.join(failed)} failed")
+                    return False
+
+        swapped = [table_name for stage in stages for table_name in stage if modes[table_name] == 'swap']
+        if swapped:
+            conn = pool.get()
+            try:
+                swap_tables(conn, swapped)
+            finally:
+                pool.put(conn)
+
+        return True
 
     except Exception as e:
         print(f"Error: {e}")
+        return False
 
     finally:
-        if conn:
-            conn.close()
+        if pool:
+            close_connection_pool(pool)
             print("Connection closed.")
+
+def load_csv_to_mysql(db_config, csv_dir, storage_format='csv', batch_size=DEFAULT_BATCH_SIZE,
+                      commit_every=DEFAULT_COMMIT_EVERY, use_load_data=False, max_connections=1, mode='append',
+                      table_modes=None):
+    """
+    Load CSV files from a directory into a MySQL database.
+    Each CSV file will be loaded into a table with the same name as the file (without the .csv extension).
+    Parquet and Arrow files are loaded the same way when `storage_format` is 'parquet' or 'arrow'.
+
+    Files are read in chunks of `batch_size` rows, so memory stays bounded by one chunk.
+    With `use_load_data`, CSV files are instead handed to `LOAD DATA LOCAL INFILE`.
+    See `load_tables_to_mysql` for the remaining options and the return value.
+    """
+    tables = {}
+    for table_name in list_tables(csv_dir, storage_format):
+        if use_load_data and storage_format == 'csv':
+            tables[table_name] = table_path(csv_dir, table_name, storage_format)
+        else:
+            tables[table_name] = iter_table_chunks(csv_dir, table_name, storage_format, batch_size)
+
+    return load_tables_to_mysql(db_config, tables, batch_size, commit_every, max_connections, mode, table_modes)
@@ -0,0 +1,153 @@
+# Column types, primary keys and secondary indexes of the star-schema tables emitted by transform_data.
+# Tables (or columns) that are not listed here are created with TEXT columns.
+
+MONEY = 'DECIMAL(14,2)'
+
+STAR_SCHEMA = {
+    'product_dim': {
+        'columns': {
+            'ProductKey': 'INT NOT NULL',
+            'ProductID': 'INT',
+            'Name': 'VARCHAR(255)',
+            'Discontinued': 'VARCHAR(16)',      # True/False, or 'Unknown' when missing
+            'CategoryID': 'INT',
+            'CategoryName': 'VARCHAR(255)',
+            'ManufacturerID': 'INT',
+            'ManufacturerName': 'VARCHAR(255)',
+            'Price': MONEY,
+            'StockLevel': 'INT',
+        },
+        'primary_key': ['ProductKey'],
+        'indexes': [],
+    },
+    'supplier_dim': {
+        'columns': {
+            'SupplierKey': 'INT NOT NULL',
+            'SupplierID': 'INT',
+            'Name': 'VARCHAR(255)',
+            'Country': 'VARCHAR(100)',
+            'Rating': 'DECIMAL(5,2)',
+            'ContractStartDate': 'DATE',
+            'ContractEndDate': 'DATE',
+        },
+        'primary_key': ['SupplierKey'],
+        'indexes': [],
+    },
+    'customer_dim': {
+        'columns': {
+            'CustomerKey': 'INT NOT NULL',
+            'CustomerID': 'INT',
+            'Name': 'VARCHAR(255)',
+            'Address': 'VARCHAR(255)',
+            'PreferredPaymentMethod': 'VARCHAR(50)',
+            'CreditLimit': MONEY,
+        },
+        'primary_key': ['CustomerKey'],
+        'indexes': [],
+    },
+    'warehouse_dim': {
+        'columns': {
+            'WarehouseKey': 'INT NOT NULL',
+            'WarehouseID': 'INT',
+            'Capacity': 'VARCHAR(32)',          # Filled with 'Unknown' when missing
+            'LocationID': 'VARCHAR(32)',        # Filled with 'Unknown' when missing
+            'LocationName': 'VARCHAR(255)',
+            'Country': 'VARCHAR(100)',
+            'City': 'VARCHAR(100)',
+        },
+        'primary_key': ['WarehouseKey'],
+        'indexes': [],
+    },
+    'time_dim': {
+        'columns': {
+            'TimeKey': 'INT NOT NULL',
+            'Date': 'DATE',
+            'Year': 'SMALLINT',
+            'Quarter': 'CHAR(6)',
+            'Month': 'VARCHAR(9)',
+            'Week': 'TINYINT',
+            'Day': 'TINYINT',
+            'Weekday': 'VARCHAR(9)',
+            'FiscalYear': 'SMALLINT',
+            'FiscalQuarter': 'CHAR(6)',
+        },
+        'primary_key': ['TimeKey'],
+        'indexes': [['Date']],
+    },
+    'sales_fct': {
+        'columns': {
+            'TimeKey': 'INT',
+            'CustomerKey': 'INT',
+            'ProductKey': 'INT',
+            'Quantity': 'INT',
+            'UnitPrice': MONEY,
+            'Discount': MONEY,
+            'Tax': MONEY,
+            'TotalAmount': MONEY,
+        },
+        'primary_key': [],
+        'indexes': [['TimeKey'], ['CustomerKey'], ['ProductKey']],
+    },
+    'purchase_fct': {
+        'columns': {
+            'TimeKey': 'INT',
+            'SupplierKey': 'INT',
+            'ProductKey': 'INT',
+            'Quantity': 'INT',
+            'UnitPrice': MONEY,
+            'Discount': MONEY,
+            'Tax': MONEY,
+            'TotalAmount': MONEY,
+        },
+        'primary_key': [],
+        'indexes': [['TimeKey'], ['SupplierKey'], ['ProductKey']],
+    },
+    'inventory_fct': {
+        'columns': {
+            'ProductKey': 'INT',
+            'WarehouseKey': 'INT',
+            'Quantity': 'INT',
+            'MinimumStockLevel': 'DECIMAL(12,2)',   # Imputed with group means
+            'MaximumStockLevel': 'DECIMAL(12,2)',
+            'ReorderPoint': 'INT',
+        },
+        'primary_key': [],
+        'indexes': [['ProductKey'], ['WarehouseKey']],
+    },
+    'return_fct': {
+        'columns': {
+            'TimeKey': 'INT',
+            'CustomerKey': 'INT',
+            'ProductKey': 'INT',
+            'Quantity': 'INT',
+            'TotalAmount': MONEY,
+            'RefundAmount': MONEY,
+        },
+        'primary_key': [],
+        'indexes': [['TimeKey'], ['CustomerKey'], ['ProductKey']],
+    },
+}
+
+
+def column_definitions(table_name, columns):
+    """
+    Build the column and primary key definitions of a CREATE TABLE statement.
+
+    Columns come from the data being loaded; their types (and the primary key)
+    come from STAR_SCHEMA, falling back to TEXT for anything not described there.
+    """
+    table_schema = STAR_SCHEMA.get(table_name, {})
+    column_types = table_schema.get('columns', {})
+
+    definitions = [f"`{col}` {column_types.get(col, 'TEXT')}" for col in columns]
+
+    primary_key = [col for col in table_schema.get('primary_key', []) if col in columns]
+    if primary_key:
+        definitions.append(f"PRIMARY KEY ({', '.join(f'`{col}`' for col in primary_key)})")
+
+    return definitions
+
+
+def index_name(columns):
+    """Name of the secondary index over `columns`."""
+    return 'idx_' + '_'.join(col.lower() for col in columns)
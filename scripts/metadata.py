@@ -17,16 +17,21 @@ def read_metadata(METADATA_FILE_PATH):
                 "CustomerKey": 0,
                 "WarehouseKey": 0,
                 "TimeKey": 0
-            }
+            },
+            "watermarks": {}
         }
 
 
-def update_metadata(last_surrogates_keys,METADATA_FILE_PATH):
+def update_metadata(last_surrogates_keys,METADATA_FILE_PATH, watermarks=None):
     """Update the metadata.json file with the latest ETL run details."""
     metadata = read_metadata(METADATA_FILE_PATH)
     
-    # Update surrogate keys
-    metadata["surrogate_keys"] = last_surrogates_keys
+    # Update surrogate keys (plain ints: pandas hands back numpy integers, which json cannot write)
+    metadata["surrogate_keys"] = {name: int(key) for name, key in last_surrogates_keys.items()}
+
+    # Update the per-table incremental extraction watermarks
+    if watermarks is not None:
+        metadata["watermarks"] = watermarks
     
     # Set today's date as the last ETL run date
     metadata["last_etl_run"] = datetime.now().strftime('%Y-%m-%d')
@@ -0,0 +1,216 @@
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from fnmatch import fnmatch
+
+# Environment variables selecting the profiled steps, e.g.
+#   ETL_PROFILE="transform_inventory,build:sales_fct,load" ETL_PROFILE_MODE="cpu,memory" python etl-pipeline.py
+# They are read on import, so worker processes profile the same steps as the parent.
+PROFILE_ENV = 'ETL_PROFILE'
+PROFILE_MODE_ENV = 'ETL_PROFILE_MODE'
+PROFILE_DIR_ENV = 'ETL_PROFILE_DIR'
+
+# 'cpu' dumps a cProfile .pstats file per step, 'memory' the top allocations of the step (tracemalloc)
+PROFILE_MODES = ('cpu', 'memory')
+
+DEFAULT_PROFILE_DIR = 'profiles'
+
+# Number of functions/allocation sites in the text reports
+DEFAULT_TOP = 25
+
+# Threads currently inside a CPU-profiled step (a thread can only run one profiler)
+CPU_PROFILING = threading.local()
+
+# Other names steps can be selected by: {step name: [aliases]} (see `register_step_alias`)
+STEP_ALIASES = {}
+
+# Names of the steps that ran (in this process or reported by its workers), to warn about selections matching none
+SEEN_STEPS = set()
+
+# Memory-profiled steps running, and whether profiling started tracemalloc (it stops it after the last one)
+MEMORY_PROFILING = {'running': 0, 'started_tracing': False}
+MEMORY_LOCK = threading.Lock()
+
+
+def profile_settings(steps, modes=('cpu',), output_dir=DEFAULT_PROFILE_DIR, top=DEFAULT_TOP):
+    """
+    Profiling settings for the steps matching `steps`, or None when no step is selected.
+
+    Steps are the names recorded in the run report ('transform:inventory', 'build:sales_fct',
+    'load', ...), written as is or with '_' for ':' ('transform_inventory'), or one of their
+    aliases, such as the function name of a builder ('create_sales_fact_table'). Shell-style
+    wildcards work too ('build:*').
+    """
+    steps = [step.strip() for step in steps if step.strip()]
+    if not steps:
+        return None
+    for mode in modes:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+    return {'steps': steps, 'modes': tuple(modes), 'output_dir': output_dir, 'top': top}
+
+
+def settings_from_env(environ=os.environ):
+    """Profiling settings from ETL_PROFILE / ETL_PROFILE_MODE / ETL_PROFILE_DIR (None when unset)."""
+    return profile_settings(
+        environ.get(PROFILE_ENV, '').split(','),
+        [mode.strip() for mode in environ.get(PROFILE_MODE_ENV, 'cpu').split(',') if mode.strip()],
+        environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR)
+    )
+
+
+# Settings of the running pipeline. While None, `profile_step` is never entered, so profiling costs nothing.
+ACTIVE_PROFILE = settings_from_env()
+
+
+def configure_profiling(steps, modes=('cpu',), output_dir=DEFAULT_PROFILE_DIR, top=DEFAULT_TOP):
+    """
+    Profile the steps matching `steps` from now on (see `profile_settings`); no steps turns profiling off.
+
+    The settings are also exported to the environment, so worker processes started later
+    profile the same steps.
+    """
+    global ACTIVE_PROFILE
+    ACTIVE_PROFILE = profile_settings(steps, modes, output_dir, top)
+    if ACTIVE_PROFILE is None:
+        os.environ.pop(PROFILE_ENV, None)
+    else:
+        os.environ[PROFILE_ENV] = ','.join(ACTIVE_PROFILE['steps'])
+        os.environ[PROFILE_MODE_ENV] = ','.join(ACTIVE_PROFILE['modes'])
+        os.environ[PROFILE_DIR_ENV] = output_dir
+    return ACTIVE_PROFILE
+
+
+def register_step_alias(step, alias):
+    """Let the step `step` also be selected for profiling as `alias` (e.g. the function it runs)."""
+    aliases = STEP_ALIASES.setdefault(step, [])
+    if alias not in aliases:
+        aliases.append(alias)
+
+
+def step_names(name):
+    """Every name the step `name` can be selected by."""
+    return [name, name.replace(':', '_')] + STEP_ALIASES.get(name, [])
+
+
+def matches(pattern, name):
+    return any(fnmatch(step_name, pattern) for step_name in step_names(name))
+
+
+def note_steps(names):
+    """Record steps that ran elsewhere (e.g. in worker processes), see `warn_unmatched_steps`."""
+    if ACTIVE_PROFILE is not None:
+        SEEN_STEPS.update(names)
+
+
+def profiled(name):
+    """Whether the step `name` is selected for profiling."""
+    if ACTIVE_PROFILE is None:
+        return False
+    SEEN_STEPS.add(name)
+    return any(matches(pattern, name) for pattern in ACTIVE_PROFILE['steps'])
+
+
+def warn_unmatched_steps():
+    """Print the selected step names that matched no step of the run (e.g. a misspelt name)."""
+    if ACTIVE_PROFILE is None:
+        return
+    unmatched = [
+        pattern for pattern in ACTIVE_PROFILE['steps']
+        if not any(matches(pattern, name) for name in SEEN_STEPS)
+    ]
+    if unmatched:
+        print(f"Warning: no step of the run matched the profiled steps {', '.join(unmatched)}; "
+              f"steps that ran: {', '.join(sorted(SEEN_STEPS))}")
+
+
+def profiling_active():
+    return ACTIVE_PROFILE is not None
+
+
+def profile_path(name, extension):
+    """File of a step's profile: <output_dir>/<timestamp>-<step>-<pid>.<extension>."""
+    os.makedirs(ACTIVE_PROFILE['output_dir'], exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    filename = f"{stamp}-{name.replace(':', '_')}-{os.getpid()}.{extension}"
+    return os.path.join(ACTIVE_PROFILE['output_dir'], filename)
+
+
+def save_cpu_profile(name, profiler):
+    """Dump a step's cProfile stats (.pstats) and a text summary of its most expensive functions."""
+    path = profile_path(name, 'pstats')
+    profiler.dump_stats(path)
+    with open(path[:-len('pstats')] + 'cpu.txt', 'w') as f:
+        stats = pstats.Stats(profiler, stream=f).sort_stats('cumulative')
+        stats.print_stats(ACTIVE_PROFILE['top'])
+    print(f"CPU profile of '{name}' saved at {path}")
+
+
+def save_memory_profile(name, before, after):
+    """Write the allocation sites that grew most during a step (tracemalloc snapshots)."""
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>')]
+    growth = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), 'lineno')
+
+    current, peak = tracemalloc.get_traced_memory()
+    path = profile_path(name, 'memory.txt')
+    with open(path, 'w') as f:
+        f.write(f"Step '{name}': traced memory {current / 2**20:.1f} MB at the end, peak {peak / 2**20:.1f} MB\n")
+        f.write(f"Top {ACTIVE_PROFILE['top']} allocation sites by growth during the step:\n")
+        for stat in growth[:ACTIVE_PROFILE['top']]:
+            f.write(f"{stat}\n")
+    print(f"Memory profile of '{name}' saved at {path}")
+
+
+@contextmanager
+def profile_step(name):
+    """
+    Profile a step when it is selected (see `profiled`), dumping its reports when it ends.
+
+    cProfile only sees the thread running the step: profile the per-table steps run by
+    worker processes/threads by their own names. A CPU-profiled step nested in another one
+    on the same thread is covered by the outer profile.
+    """
+    if not profiled(name):
+        yield
+        return
+
+    # Memory snapshots are taken outside the CPU profile, so they do not show up in it
+    before = None
+    if 'memory' in ACTIVE_PROFILE['modes']:
+        with MEMORY_LOCK:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                MEMORY_PROFILING['started_tracing'] = True
+            MEMORY_PROFILING['running'] += 1
+        before = tracemalloc.take_snapshot()
+
+    profiler = None
+    if 'cpu' in ACTIVE_PROFILE['modes'] and not getattr(CPU_PROFILING, 'active', False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            CPU_PROFILING.active = True
+        except ValueError:
+            # Another thread's step holds the interpreter-wide profiler (Python 3.12+)
+            print(f"Step '{name}' not CPU-profiled: another step is being profiled")
+            profiler = None
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            CPU_PROFILING.active = False
+        if before is not None:
+            save_memory_profile(name, before, tracemalloc.take_snapshot())
+            with MEMORY_LOCK:
+                MEMORY_PROFILING['running'] -= 1
+                if not MEMORY_PROFILING['running'] and MEMORY_PROFILING['started_tracing']:
+                    tracemalloc.stop()
+                    MEMORY_PROFILING['started_tracing'] = False
+        if profiler is not None:
+            save_cpu_profile(name, profiler)
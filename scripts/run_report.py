@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from . import profiling
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+# Report of the running pipeline. While no report is active, `report_step` and
+# `count_dropped` return at once, so instrumented code costs nothing outside a run.
+ACTIVE_REPORT = None
+
+REPORT_LOCK = threading.Lock()
+
+# Steps currently open on each thread, innermost last (dropped rows are counted on the innermost)
+OPEN_STEPS = threading.local()
+
+
+def start_run_report(trace_memory=False):
+    """
+    Start recording the steps of a run.
+
+    With `trace_memory`, tracemalloc follows every allocation so each step also records
+    the peak of traced Python/NumPy memory while it ran; this slows allocation-heavy steps down.
+    """
+    global ACTIVE_REPORT
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    ACTIVE_REPORT = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'status': 'running',
+        'trace_memory': trace_memory,
+        'steps': [],
+        '_start': time.perf_counter(),
+        '_running': [],
+    }
+    return ACTIVE_REPORT
+
+
+def finish_run_report(status='ok'):
+    """
+    Stop recording and return the report of the run.
+
+    Returns:
+    - dict: {'started', 'status', 'seconds', 'trace_memory', 'steps': [...]}
+    """
+    global ACTIVE_REPORT
+    report, ACTIVE_REPORT = ACTIVE_REPORT, None
+    if report is None:
+        return None
+
+    if report['trace_memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    report['status'] = status
+    report['seconds'] = round(time.perf_counter() - report.pop('_start'), 3)
+    report.pop('_running')
+    return report
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far, in MB (None where unavailable).
+
+    This is a lifetime high-water mark: steps record how much they raised it (see `report_step`).
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(max_rss / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+
+def fold_traced_peak(report):
+    """Credit the traced peak since the last reset to every running step, then reset it."""
+    peak = tracemalloc.get_traced_memory()[1]
+    for record in report['_running']:
+        record['_peak'] = max(record['_peak'], peak)
+    tracemalloc.reset_peak()
+
+
+@contextmanager
+def report_step(name, rows_in=None):
+    """
+    Record a step of the run: wall time, rows in/out, peak memory and dropped rows.
+
+    'peak_rss_growth_mb' is how much the step raised the process's peak resident memory:
+    0 when it stayed below an earlier peak, which only the traced peak ('peak_traced_mb',
+    reset for every step) then shows.
+
+    Yields the step's record, whose 'rows_in'/'rows_out' the caller fills in. Steps nest
+    and may run on several threads; the traced peak of a step covers everything that ran
+    in the process meanwhile. Steps selected for profiling (see scripts/profiling.py) are
+    profiled too, whether or not a report is recorded.
+    """
+    report = ACTIVE_REPORT
+    if report is None:
+        if profiling.ACTIVE_PROFILE is None:
+            yield {}
+        else:
+            with profiling.profile_step(name):
+                yield {}
+        return
+
+    record = {'step': name, 'rows_in': rows_in, 'rows_out': None, 'dropped': {}}
+    tracing = report['trace_memory'] and tracemalloc.is_tracing()
+    stack = getattr(OPEN_STEPS, 'stack', None)
+    if stack is None:
+        stack = OPEN_STEPS.stack = []
+
+    with REPORT_LOCK:
+        if tracing:
+            fold_traced_peak(report)
+            record['_peak'] = tracemalloc.get_traced_memory()[0]
+            report['_running'].append(record)
+    stack.append(record)
+    start_rss = peak_rss_mb()
+    start = time.perf_counter()
+
+    try:
+        if profiling.ACTIVE_PROFILE is None:
+            yield record
+        else:
+            with profiling.profile_step(name):
+                yield record
+        record.setdefault('status', 'ok')
+    except BaseException:
+        record['status'] = 'failed'
+        raise
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 4)
+        stack.pop()
+        with REPORT_LOCK:
+            if tracing:
+                fold_traced_peak(report)
+                report['_running'].remove(record)
+                record['peak_traced_mb'] = round(record.pop('_peak') / (1024 * 1024), 1)
+            if start_rss is not None:
+                record['peak_rss_growth_mb'] = round(peak_rss_mb() - start_rss, 1)
+            report['steps'].append(record)
+
+
+def count_dropped(reason, rows):
+    """Add `rows` dropped for `reason` (e.g. 'duplicate_key') to the innermost step of this thread."""
+    if ACTIVE_REPORT is None or not rows:
+        return
+    stack = getattr(OPEN_STEPS, 'stack', None)
+    if stack:
+        dropped = stack[-1]['dropped']
+        dropped[reason] = dropped.get(reason, 0) + int(rows)
+
+
+def run_report_active():
+    return ACTIVE_REPORT is not None
+
+
+def tracing_memory():
+    """Whether the active report traces memory (for starting worker reports alike)."""
+    return ACTIVE_REPORT is not None and ACTIVE_REPORT['trace_memory']
+
+
+def call_reported(func, trace_memory, *args):
+    """
+    Call `func(*args)` with its own report, for steps run in worker processes.
+
+    Returns:
+    - tuple: (result, recorded steps), to be merged into the parent report with `add_steps`
+    """
+    start_run_report(trace_memory)
+    try:
+        result = func(*args)
+    finally:
+        report = finish_run_report()
+    return result, report['steps']
+
+
+def add_steps(steps):
+    """Merge steps recorded elsewhere (see `call_reported`) into the active report."""
+    profiling.note_steps(record['step'] for record in steps)
+    if ACTIVE_REPORT is not None:
+        with REPORT_LOCK:
+            ACTIVE_REPORT['steps'].extend(steps)
+
+
+def save_run_report(report, report_path, history_path):
+    """
+    Write the report of a run as JSON and append it as one line to the run history.
+
+    The history (JSON lines) keeps every run, so step timings can be compared across nightly runs.
+    """
+    directory = os.path.dirname(report_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(report) + '\n')
+
+    print(f"Run report saved at {report_path}")
+
+
+def print_run_report(report, top=10):
+    """Print the slowest steps of a run and the rows they dropped."""
+    print(f"Run {report['status']} in {report['seconds']:.2f}s; slowest steps:")
+    for record in sorted(report['steps'], key=lambda record: -record['seconds'])[:top]:
+        memory = f", peak {record['peak_traced_mb']} MB traced" if 'peak_traced_mb' in record else ''
+        if record.get('peak_rss_growth_mb'):
+            memory += f", peak RSS +{record['peak_rss_growth_mb']} MB"
+        dropped = f", dropped {record['dropped']}" if record['dropped'] else ''
+        print(f"  {record['step']:<32} {record['seconds']:8.2f}s  rows {record['rows_in']} -> {record['rows_out']}"
+              f"{memory}{dropped}")
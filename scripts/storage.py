@@ -0,0 +1,191 @@
+import os
+import pandas as pd
+
+# Rows per chunk when a table is read piece by piece
+DEFAULT_CHUNK_SIZE = 50000
+
+# File extension used by each supported storage format.
+# 'parquet' and 'arrow' (Arrow IPC / Feather v2) keep column types on disk and need pyarrow.
+STORAGE_FORMATS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+
+def check_format(fmt):
+    """Raise a ValueError for storage formats that are not supported."""
+    if fmt not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown storage format '{fmt}', expected one of {sorted(STORAGE_FORMATS)}")
+
+
+def table_path(directory, table_name, fmt='csv'):
+    """Path of a table stored in `directory` with the given format."""
+    check_format(fmt)
+    return os.path.join(directory, f"{table_name}{STORAGE_FORMATS[fmt]}")
+
+
+def list_tables(directory, fmt='csv'):
+    """Names of the tables stored in `directory` with the given format."""
+    check_format(fmt)
+    extension = STORAGE_FORMATS[fmt]
+    return sorted(
+        file_name[:-len(extension)]
+        for file_name in os.listdir(directory)
+        if file_name.endswith(extension)
+    )
+
+
+def stored_columns(directory, table_name, fmt='csv'):
+    """Column names of a stored table, read from its header or schema only."""
+    path = table_path(directory, table_name, fmt)
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if fmt == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def select_columns(directory, table_name, fmt, columns):
+    """The requested `columns` the stored table has (all of them when `columns` is None)."""
+    if columns is None:
+        return None
+    stored = stored_columns(directory, table_name, fmt)
+    return [col for col in stored if col in set(columns)]
+
+
+def read_table(directory, table_name, fmt='csv', columns=None, **read_options):
+    """
+    Read a table from `directory`.
+
+    With `columns`, only those columns are read (the ones the table lacks are ignored).
+    Extra keyword arguments are handed to `pd.read_csv` for CSV files; typed
+    formats already carry their schema and ignore them.
+    """
+    path = table_path(directory, table_name, fmt)
+    columns = select_columns(directory, table_name, fmt, columns)
+
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if fmt == 'arrow':
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, **read_options)
+
+
+def to_arrow_compatible(df):
+    """
+    Store object columns that mix Python types as strings.
+
+    Arrow columns have a single type, so a column such as 'discontinued'
+    (booleans filled with 'Unknown') cannot be written as is.
+    """
+    mixed = [
+        col for col in df.columns
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed')
+    ]
+    if not mixed:
+        return df
+
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_table(df, directory, table_name, fmt='csv'):
+    """Write a table to `directory` and return the path it was written to."""
+    path = table_path(directory, table_name, fmt)
+
+    if fmt != 'csv':
+        df = to_arrow_compatible(df)
+
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'arrow':
+        # Feather requires a default RangeIndex
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+    return path
+
+
+def iter_table_chunks(directory, table_name, fmt='csv', chunksize=DEFAULT_CHUNK_SIZE, columns=None, **read_options):
+    """
+    Yield a stored table as DataFrames of at most `chunksize` rows, so it is never fully in memory.
+
+    `columns` and extra keyword arguments work as in `read_table`.
+    """
+    path = table_path(directory, table_name, fmt)
+    columns = select_columns(directory, table_name, fmt, columns)
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif fmt == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                yield (batch if columns is None else batch.select(columns)).to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns, **read_options)
+
+
+class TableWriter:
+    """
+    Append DataFrame batches to a single table file.
+
+    Used by the streaming extraction so batches can be written as they arrive
+    in any storage format. The schema of typed formats is fixed by the first batch.
+    """
+
+    def __init__(self, directory, table_name, fmt='csv'):
+        self.path = table_path(directory, table_name, fmt)
+        self.fmt = fmt
+        self._file = None
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        if self.fmt == 'csv':
+            if self._file is None:
+                self._file = open(self.path, 'w', newline='')
+                df.to_csv(self._file, index=False)
+            else:
+                df.to_csv(self._file, index=False, header=False)
+            return
+
+        import pyarrow as pa
+
+        df = to_arrow_compatible(df)
+        if self._writer is None:
+            batch = pa.Table.from_pandas(df, preserve_index=False)
+            self._schema = batch.schema
+            if self.fmt == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self._schema)
+        else:
+            batch = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+
+        self._writer.write_table(batch)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def nodes_to_run(graph, targets=None, results=None):
+    """
+    Nodes needed to produce `targets` (every node by default).
+
+    Dependencies whose result is already in `results` are not run again, so a
+    single node can be re-run on top of a previous run.
+    """
+    results = results or {}
+    pending = list(graph if targets is None else targets)
+    needed = set()
+
+    while pending:
+        name = pending.pop()
+        if name not in graph:
+            raise KeyError(f"Unknown node '{name}'")
+        if name in needed:
+            continue
+        needed.add(name)
+        pending.extend(dep for dep in graph[name] if dep not in results)
+
+    return needed
+
+
+def run_graph(graph, run_node, workers=1, targets=None, results=None):
+    """
+    Run the nodes of a dependency graph, each as soon as its dependencies are done.
+
+    `graph` maps node names to the names of the nodes they depend on, and
+    `run_node(name, results)` computes a node from the results of the others.
+    Independent nodes run concurrently on `workers` threads.
+
+    Returns:
+    - tuple: (results by node name, seconds spent in each node that ran)
+    """
+    results = dict(results or {})
+    remaining = nodes_to_run(graph, targets, results)
+    timings = {}
+
+    def timed(name):
+        start = time.perf_counter()
+        result = run_node(name, results)
+        return result, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        running = {}
+        while remaining or running:
+            ready = [name for name in remaining if all(dep in results for dep in graph[name])]
+            for name in ready:
+                remaining.discard(name)
+                running[executor.submit(timed, name)] = name
+
+            if not running:
+                raise ValueError(f"Dependency cycle between nodes: {', '.join(sorted(remaining))}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name], timings[name] = future.result()
+
+    return results, timings
+
+
+def critical_path(graph, timings):
+    """
+    Longest chain of dependent nodes of a run, i.e. the lower bound of its wall-clock time.
+
+    Returns:
+    - tuple: (node names from first to last, total seconds)
+    """
+    finish = {}
+    previous = {}
+
+    def finish_time(name):
+        if name not in finish:
+            deps = [dep for dep in graph[name] if dep in timings]
+            slowest = max(deps, key=finish_time, default=None)
+            previous[name] = slowest
+            finish[name] = timings[name] + (finish_time(slowest) if slowest else 0)
+        return finish[name]
+
+    if not timings:
+        return [], 0
+
+    last = max(timings, key=finish_time)
+    path = []
+    while last is not None:
+        path.append(last)
+        last = previous[last]
+
+    return path[::-1], finish[path[0]]
+
+
+def print_graph_report(graph, timings, wall_seconds):
+    """Print the time of every node and the critical path of a run."""
+    for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"  {name:<20} {seconds:8.2f}s")
+
+    path, path_seconds = critical_path(graph, timings)
+    print(f"Critical path: {' -> '.join(path)} ({path_seconds:.2f}s of {wall_seconds:.2f}s wall-clock)")
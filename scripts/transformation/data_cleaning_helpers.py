@@ -1,7 +1,11 @@
 
 import pandas as pd
 
+from ..run_report import count_dropped
+
 #HELPER FUNCTION
+# Helpers taking `copy` work on a copy of the DataFrame by default; `apply_cleaning_plan`
+# passes copy=False so a whole cleaning plan costs a single copy of the table.
 def remove_null_primary_keys(df, primary_keys):
     df_cleaned = df.dropna(subset=primary_keys)
     return df_cleaned
@@ -13,31 +17,143 @@ def drop_columns(df, columns_to_drop):
     df_cleaned = df.drop(columns=columns_to_drop, errors='ignore')
     return df_cleaned
 
-def fill_missing_numeric(df, numeric_fields, fill_value=0):
-    df_cleaned = df.copy()
+def fill_missing_numeric(df, numeric_fields, fill_value=0, copy=True):
+    df_cleaned = df.copy() if copy else df
     for field in numeric_fields:
         df_cleaned[field] = df_cleaned[field].fillna(fill_value)
     return df_cleaned
 
-def fill_missing_text(df, text_fields, fill_value="Unknown"):
-    df_cleaned = df.copy()
+def fill_missing_text(df, text_fields, fill_value="Unknown", copy=True):
+    df_cleaned = df.copy() if copy else df
     for field in text_fields:
-        df_cleaned[field] = df_cleaned[field].fillna(fill_value)
+        column = df_cleaned[field]
+        # Typed (e.g. Int64/boolean) columns cannot hold the text placeholder
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Categories read from the raw schema need the placeholder as a category
+            if fill_value not in column.cat.categories:
+                column = column.cat.add_categories([fill_value])
+        elif column.hasnans and not (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)):
+            column = column.astype(object)
+        df_cleaned[field] = column.fillna(fill_value)
+    return df_cleaned
+
+def fill_missing_by_group(df, group_by, fields, stat='mean', fallback=None, copy=True):
+    """
+    Fill missing values of `fields` with the `stat` ('mean', 'median', ...) of their group.
+
+    The statistics of every field come from a single built-in groupby aggregation.
+    With `fallback`, groups without any known value get that statistic of the group
+    statistics instead (e.g. the median of the per-group medians).
+    """
+    df_cleaned = df.copy() if copy else df
+    grouped = df_cleaned.groupby(group_by)[fields]
+    group_stats = grouped.transform(stat)
+
+    if fallback is not None:
+        group_stats = group_stats.fillna(grouped.agg(stat).agg(fallback))
+
+    for field in fields:
+        df_cleaned[field] = df_cleaned[field].fillna(group_stats[field])
     return df_cleaned
 
-def round_numeric_columns(df, numeric_fields, decimals=2):
-    df_cleaned = df.copy()
+def backfill_from_lookup(df, target, key, copy=True):
+    """Fill missing `target` values with the first known `target` of the rows sharing their `key`."""
+    df_cleaned = df.copy() if copy else df
+    # One key -> value lookup, applied with a single map instead of a search per missing row
+    lookup = df_cleaned.dropna(subset=[target, key]).drop_duplicates(subset=[key]).set_index(key)[target]
+    df_cleaned[target] = df_cleaned[target].fillna(df_cleaned[key].map(lookup))
+    return df_cleaned
+
+def round_numeric_columns(df, numeric_fields, decimals=2, copy=True):
+    df_cleaned = df.copy() if copy else df
     for field in numeric_fields:
         df_cleaned[field] = df_cleaned[field].round(decimals)
     return df_cleaned
 
-def format_dates(df, date_fields):
-    df_cleaned = df.copy()
+def format_dates(df, date_fields, copy=True):
+    df_cleaned = df.copy() if copy else df
 
     for field in date_fields:
         if field in df_cleaned.columns:
-            df_cleaned[field] = pd.to_datetime(df_cleaned[field], errors='coerce')
+            # Typed storage formats already deliver parsed dates
+            if not pd.api.types.is_datetime64_any_dtype(df_cleaned[field]):
+                df_cleaned[field] = pd.to_datetime(df_cleaned[field], errors='coerce')
         else:
             print(f"Warning: Column '{field}' does not exist in the DataFrame.")
     
     return df_cleaned
+
+
+# CLEANING PLANS
+def apply_cleaning_plan(df, plan):
+    """
+    Clean a table according to a declarative plan, in one pass with a single copy.
+
+    Recognised plan entries, applied in this order:
+    - 'primary_key': rows with a null key are dropped, then duplicate keys (first one kept)
+    - 'required': other columns whose null rows are dropped
+    - 'drop': columns removed from the output
+    - 'backfill': {column: key column} filled from the rows sharing the key (see backfill_from_lookup)
+    - 'fill_by_group': list of fill_missing_by_group keyword dicts (group_by, fields, stat, fallback)
+    - 'fill_text': columns filled with "Unknown"
+    - 'fill_numeric': {column: value or statistic name such as 'median'}
+    - 'dates': columns parsed as dates
+    - 'fill_dates': {date column: placeholder date}
+    - 'round': columns rounded to two decimals
+    - 'astype': {column: dtype}
+
+    Row filters become one boolean mask and the kept rows/columns are taken with a
+    single `.loc`, which is the only copy of the table; every later step updates it in place.
+    Steps on columns the table was read without (see projection.py) are skipped.
+    """
+    primary_key = plan.get('primary_key', [])
+    required = plan.get('required', [])
+    backfill = plan.get('backfill', {})
+
+    # Step 1: One positional mask for every row filter (null keys, duplicate keys, null required columns)
+    keep = df[primary_key + required].notna().all(axis=1) if primary_key or required else pd.Series(True, index=df.index)
+    count_dropped('null_key', (~keep).sum())
+    if primary_key:
+        duplicates = df[primary_key].duplicated()
+        count_dropped('duplicate_key', (duplicates & keep).sum())
+        keep &= ~duplicates
+
+    # Step 2: The single copy; dropped columns still needed as backfill keys go at the end
+    late_drops = [col for col in plan.get('drop', []) if col in backfill.values()]
+    columns = [col for col in df.columns if col not in plan.get('drop', []) or col in late_drops]
+    df_cleaned = df.loc[keep.values, columns]
+
+    def present(fields):
+        return [field for field in fields if field in df_cleaned.columns]
+
+    # Step 3: Fills, parsing and rounding on the copy
+    for target, key in backfill.items():
+        df_cleaned = backfill_from_lookup(df_cleaned, target, key, copy=False)
+
+    for group_fill in plan.get('fill_by_group', []):
+        fields = present(group_fill['fields'])
+        if fields:
+            df_cleaned = fill_missing_by_group(df_cleaned, copy=False, **{**group_fill, 'fields': fields})
+
+    df_cleaned = fill_missing_text(df_cleaned, present(plan.get('fill_text', [])), copy=False)
+
+    for field, fill_value in plan.get('fill_numeric', {}).items():
+        if field not in df_cleaned.columns:
+            continue
+        if isinstance(fill_value, str):
+            fill_value = df_cleaned[field].agg(fill_value)
+        df_cleaned = fill_missing_numeric(df_cleaned, [field], fill_value=fill_value, copy=False)
+
+    df_cleaned = format_dates(df_cleaned, present(plan.get('dates', [])), copy=False)
+    for field in present(plan.get('fill_dates', {})):
+        df_cleaned[field] = df_cleaned[field].fillna(pd.Timestamp(plan['fill_dates'][field]))
+
+    df_cleaned = round_numeric_columns(df_cleaned, present(plan.get('round', [])), copy=False)
+
+    for field in present(plan.get('astype', {})):
+        df_cleaned[field] = df_cleaned[field].astype(plan['astype'][field])
+
+    if late_drops:
+        df_cleaned = df_cleaned.drop(columns=late_drops)
+
+    return df_cleaned
@@ -1,8 +1,27 @@
 
 import pandas as pd
+from .key_store import assign_surrogate_keys
+from .key_resolution import build_key_index, resolve_keys
+from ..profiling import register_step_alias
+from ..run_report import count_dropped
 
 
-def create_product_dim(transformed_tables, last_surrogates_keys):
+def assign_keys(dim, dimension, natural_key, key_col, last_surrogates_keys, key_store=None):
+    """
+    Add surrogate keys to a dimension.
+
+    Without a key store every row is numbered after the last key handed out. With one,
+    existing members keep their keys and only new or changed rows are returned.
+    """
+    if key_store is not None:
+        return assign_surrogate_keys(key_store, dimension, dim, natural_key, key_col, last_surrogates_keys)
+
+    dim[key_col] = range(last_surrogates_keys[key_col] + 1, last_surrogates_keys[key_col] + len(dim) + 1)
+    last_surrogates_keys[key_col] = dim[key_col].max()  # Update the last key value
+    return dim, last_surrogates_keys
+
+
+def create_product_dim(transformed_tables, last_surrogates_keys, key_store=None):
     # Extract necessary dataframes
     product = transformed_tables['product']
     category = transformed_tables['category']
@@ -27,16 +46,18 @@ def create_product_dim(transformed_tables, last_surrogates_keys):
     }
     tempdf.rename(columns=rename_dict, inplace=True)
 
-    # Step 3: Assign surrogate keys
-    tempdf['ProductKey'] = range(last_surrogates_keys['ProductKey'] + 1, last_surrogates_keys['ProductKey'] + len(tempdf) + 1)
-    last_surrogates_keys['ProductKey'] = tempdf['ProductKey'].max()
-
     # Optional: Handle missing values if necessary
     tempdf['StockLevel'] = tempdf['StockLevel'].fillna(0)
 
-    # Step 4: Remove duplicates
+    # Discontinued mixes booleans with the 'Unknown' placeholder; keep it textual
+    tempdf['Discontinued'] = tempdf['Discontinued'].astype(str)
+
+    # Step 3: Remove duplicates
     tempdf = tempdf.drop_duplicates()
 
+    # Step 4: Assign surrogate keys
+    tempdf, last_surrogates_keys = assign_keys(tempdf, 'product_dim', 'ProductID', 'ProductKey', last_surrogates_keys, key_store)
+
     # Step 5: Reorder columns as per the schema
     reordered_columns = [
         'ProductKey','ProductID', 'Name', 'Discontinued' ,'CategoryID', 'CategoryName',
@@ -52,7 +73,7 @@ def create_product_dim(transformed_tables, last_surrogates_keys):
 
 
 
-def create_supplier_dim(transformed_tables, last_surrogates_keys):
+def create_supplier_dim(transformed_tables, last_surrogates_keys, key_store=None):
     # Extract the supplier dataframe
     supplier = transformed_tables['supplier']
 
@@ -79,8 +100,7 @@ def create_supplier_dim(transformed_tables, last_surrogates_keys):
     supplier_dim = supplier_dim.drop_duplicates()
 
     # Step 4: Assign surrogate keys
-    supplier_dim['SupplierKey'] = range(last_surrogates_keys['SupplierKey'] + 1, last_surrogates_keys['SupplierKey'] + len(supplier_dim) + 1)
-    last_surrogates_keys['SupplierKey'] = supplier_dim['SupplierKey'].max()  # Update the last SupplierKey value
+    supplier_dim, last_surrogates_keys = assign_keys(supplier_dim, 'supplier_dim', 'SupplierID', 'SupplierKey', last_surrogates_keys, key_store)
 
     # Step 5: Reorder columns to match the supplier_dim schema
     reorder = ['SupplierKey', 'SupplierID', 'Name', 'Country', 'Rating', 'ContractStartDate', 'ContractEndDate']
@@ -93,7 +113,7 @@ def create_supplier_dim(transformed_tables, last_surrogates_keys):
 
 
 
-def create_customer_dim(transformed_tables, last_surrogates_keys):
+def create_customer_dim(transformed_tables, last_surrogates_keys, key_store=None):
     # Extract the customer dataframe
     customer = transformed_tables['customer']
 
@@ -118,11 +138,7 @@ def create_customer_dim(transformed_tables, last_surrogates_keys):
     customer_dim = customer_dim.drop_duplicates()
 
     # Step 4: Assign surrogate keys
-    customer_dim['CustomerKey'] = range(
-        last_surrogates_keys['CustomerKey'] + 1, 
-        last_surrogates_keys['CustomerKey'] + len(customer_dim) + 1
-    )
-    last_surrogates_keys['CustomerKey'] = customer_dim['CustomerKey'].max()  # Update the last CustomerKey value
+    customer_dim, last_surrogates_keys = assign_keys(customer_dim, 'customer_dim', 'CustomerID', 'CustomerKey', last_surrogates_keys, key_store)
 
     # Step 5: Reorder columns to match the customer_dim schema
     reorder = ['CustomerKey', 'CustomerID', 'Name', 'Address', 'PreferredPaymentMethod', 'CreditLimit']
@@ -136,7 +152,7 @@ def create_customer_dim(transformed_tables, last_surrogates_keys):
 
 
 
-def create_warehouse_dim(transformed_tables, last_surrogates_keys):
+def create_warehouse_dim(transformed_tables, last_surrogates_keys, key_store=None):
     # Extract the warehouse and location dataframes
     warehouse = transformed_tables['warehouse']
     location = transformed_tables['location']
@@ -167,11 +183,7 @@ def create_warehouse_dim(transformed_tables, last_surrogates_keys):
     warehouse_dim = warehouse_dim.drop_duplicates()
 
     # Step 6: Assign surrogate keys
-    warehouse_dim['WarehouseKey'] = range(
-        last_surrogates_keys['WarehouseKey'] + 1, 
-        last_surrogates_keys['WarehouseKey'] + len(warehouse_dim) + 1
-    )
-    last_surrogates_keys['WarehouseKey'] = warehouse_dim['WarehouseKey'].max()  # Update the last WarehouseKey value
+    warehouse_dim, last_surrogates_keys = assign_keys(warehouse_dim, 'warehouse_dim', 'WarehouseID', 'WarehouseKey', last_surrogates_keys, key_store)
 
     # Step 7: Reorder columns to match the warehouse_dim schema
     reorder = ['WarehouseKey', 'WarehouseID', 'Capacity', 'LocationID', 'LocationName', 'Country', 'City']
@@ -185,40 +197,129 @@ def create_warehouse_dim(transformed_tables, last_surrogates_keys):
 
 
 
+# Placeholder used by the cleaning step for missing dates; it is not a calendar day
+MISSING_DATE = pd.Timestamp('1900-01-01')
+
+# Smallest YYYYMMDD TimeKey; smaller values in the metadata are counters from older runs
+FIRST_DATE_KEY = 19000101
+
+# Tables and date columns that span the calendar of the time dimension
+TIME_DIM_DATE_COLUMNS = {
+    'employee': ['hiredate'],
+    'inventory': ['lastreorderdate', 'expecteddeliverydate'],
+    'purchaseorder': ['orderdate', 'expecteddeliverydate', 'actualdeliverydate'],
+    'payment': ['paymentdate'],
+    'returns': ['returndate'],
+    'salesorder': ['orderdate', 'actualdeliverydate'],
+    'shipment': ['shipmentdate', 'estimatedarrivaldate', 'actualarrivaldate'],
+    'supplier': ['contractstartdate', 'contractenddate']
+}
+
+# Inputs of each dimension and fact builder: the cleaned tables and columns it reads and
+# the dimensions whose keys it needs (passed to fact builders in this order). Facts derive
+# TimeKey from their dates, so none of them waits for time_dim. The columns drive the
+# projection of the raw tables (see projection.py), so list every column a builder reads.
+STAR_SCHEMA_NODES = {
+    'product_dim': {
+        'tables': {
+            'product': ['productid', 'name', 'price', 'stocklevel', 'discontinued', 'categoryid', 'manufacturerid'],
+            'category': ['categoryid', 'name'],
+            'manufacturer': ['manufacturerid', 'name'],
+        },
+        'depends_on': [],
+    },
+    'supplier_dim': {
+        'tables': {'supplier': ['supplierid', 'name', 'country', 'rating', 'contractstartdate', 'contractenddate']},
+        'depends_on': [],
+    },
+    'customer_dim': {
+        'tables': {'customer': ['customerid', 'name', 'address', 'preferredpaymentmethod', 'creditlimit']},
+        'depends_on': [],
+    },
+    'warehouse_dim': {
+        'tables': {
+            'warehouse': ['warehouseid', 'capacity', 'locationid'],
+            'location': ['locationid', 'name', 'country', 'city'],
+        },
+        'depends_on': [],
+    },
+    'time_dim': {'tables': dict(TIME_DIM_DATE_COLUMNS), 'depends_on': []},
+    'sales_fct': {
+        'tables': {
+            'salesorder': ['orderid', 'customerid', 'orderdate'],
+            'salesorderdetail': ['orderid', 'productid', 'quantity', 'unitprice', 'discount', 'tax', 'totalamount'],
+        },
+        'depends_on': ['customer_dim', 'product_dim'],
+    },
+    'purchase_fct': {
+        'tables': {
+            'purchaseorder': ['orderid', 'supplierid', 'orderdate'],
+            'purchaseorderdetail': ['orderid', 'productid', 'quantity', 'unitprice', 'discount', 'tax', 'totalamount'],
+        },
+        'depends_on': ['supplier_dim', 'product_dim'],
+    },
+    'inventory_fct': {
+        'tables': {
+            'inventory': ['productid', 'warehouseid', 'quantity', 'minimumstocklevel', 'maximumstocklevel', 'reorderpoint'],
+        },
+        'depends_on': ['product_dim', 'warehouse_dim'],
+    },
+    'return_fct': {
+        'tables': {
+            'returns': ['returnid', 'customerid', 'returndate', 'refundamount'],
+            'returndetail': ['returnid', 'productid', 'quantity', 'totalamount'],
+        },
+        'depends_on': ['customer_dim', 'product_dim'],
+    },
+}
+
+
+def date_to_time_key(dates):
+    """
+    Deterministic YYYYMMDD TimeKey of each date (e.g. 2024-03-07 -> 20240307).
+
+    Missing dates and the 1900-01-01 placeholder get no key.
+    """
+    dates = pd.to_datetime(dates, errors='coerce')
+    keys = dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+    return keys.where(dates > MISSING_DATE).astype('Int64')
+
+
+def time_key_to_date(time_key):
+    """Date of a YYYYMMDD TimeKey."""
+    return pd.to_datetime(str(int(time_key)), format='%Y%m%d')
+
+
 def create_time_dim(transformed_tables, last_surrogates_keys):
-    # List of tables that contain date columns
-    date_columns = {
-        'employee': ['hiredate'],
-        'inventory': ['lastreorderdate', 'expecteddeliverydate'],
-        'purchaseorder': ['orderdate', 'expecteddeliverydate', 'actualdeliverydate'],
-        'payment': ['paymentdate'],
-        'returns': ['returndate'],
-        'salesorder': ['orderdate', 'actualdeliverydate'],
-        'shipment': ['shipmentdate', 'estimatedarrivaldate', 'actualarrivaldate'],
-        'supplier': ['contractstartdate', 'contractenddate']
-    }
+    """
+    Extend the calendar of the time dimension up to the latest date in the data.
 
-    # Extract dates from all tables, replacing NA with '1900-01-01'
-    dates = []
+    `last_surrogates_keys['TimeKey']` holds the last day (as YYYYMMDD) already in the
+    warehouse, so only the days after it are returned; the first run builds the calendar
+    from the earliest date. Only a min/max per date column is computed, no per-date objects.
+    """
+    # Step 1: Earliest and latest real date of every column (missing dates and the placeholder are skipped)
+    min_dates, max_dates = [], []
 
-    for table_name, columns in date_columns.items():
+    for table_name, columns in TIME_DIM_DATE_COLUMNS.items():
         for column in columns:
             if column in transformed_tables[table_name].columns:
-                # Fill NA values with '1900-01-01'
-                filled_dates = pd.to_datetime(transformed_tables[table_name][column].fillna(pd.Timestamp('1900-01-01')), errors='coerce')
-                dates.extend(filled_dates.dropna().tolist())
-
-    # Convert list of dates to a pandas datetime series
-    dates = pd.to_datetime(dates, errors='coerce').dropna().sort_values().unique()
-
-    # Step 2: Start from the next available date after '1900-01-01'
-    min_date = pd.Timestamp('1900-01-01')
-    next_date = min(dates[dates > min_date]) if len(dates[dates > min_date]) > 0 else min_date
-
-    # Step 3: Create the date range from the next available date to the latest date
-    start_date = next_date
-    end_date = dates.max()
-    date_range = pd.date_range(start=start_date, end=end_date)
+                dates = pd.to_datetime(transformed_tables[table_name][column], errors='coerce')
+                dates = dates[dates > MISSING_DATE]
+                if len(dates):
+                    min_dates.append(dates.min())
+                    max_dates.append(dates.max())
+
+    # Step 2: Continue after the last day already in the calendar, or start at the earliest date
+    last_time_key = last_surrogates_keys['TimeKey']
+    if last_time_key >= FIRST_DATE_KEY:
+        start_date = time_key_to_date(last_time_key) + pd.Timedelta(days=1)
+    else:
+        start_date = min(min_dates) if min_dates else MISSING_DATE
+
+    # Step 3: Create the date range up to the latest date (empty when the calendar is up to date)
+    end_date = max(max_dates) if max_dates else start_date - pd.Timedelta(days=1)
+    date_range = pd.date_range(start=start_date.normalize(), end=end_date.normalize())
 
     # Step 4: Create the time dimension table
     time_dim = pd.DataFrame(date_range, columns=['Date'])
@@ -235,141 +336,237 @@ def create_time_dim(transformed_tables, last_surrogates_keys):
     time_dim['FiscalYear'] = time_dim['Year']  # Can be customized based on fiscal year
     time_dim['FiscalQuarter'] = time_dim['Quarter'].astype(str)
 
-    # Step 5: Create a surrogate TimeKey (integer)
-    time_dim['TimeKey'] = range(
-        last_surrogates_keys['TimeKey'] + 1, 
-        last_surrogates_keys['TimeKey'] + len(time_dim) + 1
-    )
+    # Step 5: Deterministic TimeKey (YYYYMMDD)
+    time_dim['TimeKey'] = date_to_time_key(time_dim['Date']).astype('int64')
 
-    # Update last_surrogates_keys
-    last_surrogates_keys['TimeKey'] = time_dim['TimeKey'].max()
+    # Update last_surrogates_keys with the last day in the calendar
+    if len(time_dim):
+        last_surrogates_keys['TimeKey'] = int(time_dim['TimeKey'].max())
 
     # Reorder columns to match the time_dim schema
     reordered_col = ['TimeKey', 'Date', 'Year', 'Quarter', 'Month', 'Week', 'Day', 'Weekday', 'FiscalYear', 'FiscalQuarter']
     time_dim = time_dim[reordered_col]
 
-    # Return the final time_dim dataframe and updated surrogate keys
+    # Return the new days of the time_dim and updated surrogate keys
     return time_dim, last_surrogates_keys
 
 
 
 
-def create_sales_fact_table(transformed_tables, time_dim, customer_dim, product_dim, last_surrogates_keys):
+def join_header(detail, header_lookup, key):
+    """
+    Inner-join detail rows with their header row through the header's index.
+
+    `header_lookup` is the header table indexed by `key`; its hash table is built once
+    and reused for every chunk, so no full-table merge is needed per chunk.
+    """
+    positions = header_lookup.index.get_indexer(detail[key])
+    matched = positions >= 0
+    count_dropped('no_header', (~matched).sum())
+    header_rows = header_lookup.iloc[positions[matched]].reset_index(drop=True)
+    return pd.concat([detail.loc[matched].reset_index(drop=True), header_rows], axis=1)
+
+
+# Handling of fact rows whose customer/supplier/product/warehouse is not in its dimension
+# (see UNMATCHED_MODES); sales orders keep them with a missing key, the other facts drop them
+FACT_UNMATCHED_KEYS = {
+    'sales_fct': 'left',
+    'purchase_fct': 'inner',
+    'inventory_fct': 'inner',
+    'return_fct': 'inner',
+}
+
+
+def create_sales_fact_table(transformed_tables, customer_dim, product_dim, unmatched=None):
     # Step 1: Get sales data from 'salesorder' and 'salesorderdetail' tables
-    sales = transformed_tables['salesorder'].drop(columns=['totalamount'])
+    sales = transformed_tables['salesorder'][['orderid', 'customerid', 'orderdate']]
     sales_fct = pd.merge(sales, transformed_tables['salesorderdetail'], on='orderid', how='inner')
+    count_dropped('no_header', len(transformed_tables['salesorderdetail']) - len(sales_fct))
+
+    customer_keys = build_key_index(customer_dim, 'CustomerID', 'CustomerKey')
+    product_keys = build_key_index(product_dim, 'ProductID', 'ProductKey')
+    return sales_fact_rows(sales_fct, customer_keys, product_keys, unmatched or FACT_UNMATCHED_KEYS['sales_fct'])
+
 
-    # Step 2: Convert 'orderdate' to datetime format
-    sales_fct['OrderDate'] = pd.to_datetime(sales_fct['orderdate'])
+def iter_sales_fact_chunks(transformed_tables, detail_chunks, customer_dim, product_dim, unmatched=None):
+    """Build sales_fct chunk by chunk from streamed 'salesorderdetail' chunks."""
+    sales = transformed_tables['salesorder'][['orderid', 'customerid', 'orderdate']].set_index('orderid')
+    customer_keys = build_key_index(customer_dim, 'CustomerID', 'CustomerKey')
+    product_keys = build_key_index(product_dim, 'ProductID', 'ProductKey')
+    for chunk in detail_chunks:
+        yield sales_fact_rows(
+            join_header(chunk, sales, 'orderid'), customer_keys, product_keys,
+            unmatched or FACT_UNMATCHED_KEYS['sales_fct']
+        )
 
-    # Step 3: Merge TimeKey from time_dim
-    sales_fct = pd.merge(sales_fct, time_dim[['Date', 'TimeKey']], left_on='OrderDate', right_on='Date', how='left')
 
-    # Step 4: Merge CustomerKey from customer_dim
-    sales_fct = pd.merge(sales_fct, customer_dim[['CustomerID', 'CustomerKey']], left_on='customerid', right_on='CustomerID', how='left')
+def sales_fact_rows(sales_fct, customer_keys, product_keys, unmatched):
+    # Step 2: TimeKey straight from 'orderdate' (YYYYMMDD)
+    sales_fct['TimeKey'] = date_to_time_key(sales_fct['orderdate'])
 
-    # Step 5: Merge ProductKey from product_dim
-    sales_fct = pd.merge(sales_fct, product_dim[['ProductID', 'ProductKey']],  left_on='productid', right_on='ProductID', how='left')
+    # Step 3: Look up CustomerKey and ProductKey in the customer_dim and product_dim indexes
+    sales_fct = resolve_keys(sales_fct, {'customerid': customer_keys, 'productid': product_keys}, unmatched)
 
-    # Step 6: Select relevant columns for the final sales_fct
+    # Step 4: Select relevant columns for the final sales_fct
     sales_fct = sales_fct[['TimeKey', 'CustomerKey', 'ProductKey', 'quantity', 'unitprice', 'discount', 'tax', 'totalamount']]
 
-    # Step 7: Rename columns to align with the fact table schema
+    # Step 5: Rename columns to align with the fact table schema
     sales_fct.columns = ['TimeKey', 'CustomerKey', 'ProductKey', 'Quantity', 'UnitPrice', 'Discount', 'Tax', 'TotalAmount']
 
-    # Step 8: Return the final sales_fct table
+    # Step 6: Return the final sales_fct table
     return sales_fct
 
 
 
 
-def create_purchase_fact_table(transformed_tables, time_dim, supplier_dim, product_dim):
+def create_purchase_fact_table(transformed_tables, supplier_dim, product_dim, unmatched=None):
     # Step 1: Join 'purchaseorder' and 'purchaseorderdetail' on 'orderid'
-    purchaseorder = transformed_tables['purchaseorder'].drop(columns=['totalamount'])
+    purchaseorder = transformed_tables['purchaseorder'][['orderid', 'supplierid', 'orderdate']]
     purchase_fct = pd.merge(purchaseorder, transformed_tables['purchaseorderdetail'], on='orderid', how='inner')
+    count_dropped('no_header', len(transformed_tables['purchaseorderdetail']) - len(purchase_fct))
+
+    supplier_keys = build_key_index(supplier_dim, 'SupplierID', 'SupplierKey')
+    product_keys = build_key_index(product_dim, 'ProductID', 'ProductKey')
+    return purchase_fact_rows(purchase_fct, supplier_keys, product_keys, unmatched or FACT_UNMATCHED_KEYS['purchase_fct'])
+
+
+def iter_purchase_fact_chunks(transformed_tables, detail_chunks, supplier_dim, product_dim, unmatched=None):
+    """Build purchase_fct chunk by chunk from streamed 'purchaseorderdetail' chunks."""
+    purchaseorder = transformed_tables['purchaseorder'][['orderid', 'supplierid', 'orderdate']].set_index('orderid')
+    supplier_keys = build_key_index(supplier_dim, 'SupplierID', 'SupplierKey')
+    product_keys = build_key_index(product_dim, 'ProductID', 'ProductKey')
+    for chunk in detail_chunks:
+        yield purchase_fact_rows(
+            join_header(chunk, purchaseorder, 'orderid'), supplier_keys, product_keys,
+            unmatched or FACT_UNMATCHED_KEYS['purchase_fct']
+        )
 
-    # Step 2: Convert 'orderdate' to datetime format and map TimeKey from time_dim
-    purchase_fct['OrderDate'] = pd.to_datetime(purchase_fct['orderdate'])
-    purchase_fct = pd.merge(purchase_fct, time_dim[['Date', 'TimeKey']], left_on='OrderDate', right_on='Date', how='left')
-
-    # Step 3: Map SupplierKey from supplier_dim
-    purchase_fct = pd.merge(
-        purchase_fct, 
-        supplier_dim[['SupplierID', 'SupplierKey']], 
-        left_on='supplierid', right_on='SupplierID', 
-        how='left', 
-        indicator=True
-    )
-    purchase_fct = purchase_fct[purchase_fct['_merge'] == 'both']  # Retain only matches
-    purchase_fct.drop(columns=['supplierid', 'SupplierID', '_merge'], inplace=True)
-
-    # Step 4: Map ProductKey from product_dim
-    purchase_fct = pd.merge(
-        purchase_fct, 
-        product_dim[['ProductID', 'ProductKey']], 
-        left_on='productid', right_on='ProductID', 
-        how='left', 
-        indicator=True
-    )
-    purchase_fct = purchase_fct[purchase_fct['_merge'] == 'both']  # Retain only matches
-    purchase_fct.drop(columns=['productid', 'ProductID', '_merge'], inplace=True)
 
-    # Step 5: Select relevant columns for the final purchase_fct
+def purchase_fact_rows(purchase_fct, supplier_keys, product_keys, unmatched):
+    # Step 2: TimeKey straight from 'orderdate' (YYYYMMDD)
+    purchase_fct['TimeKey'] = date_to_time_key(purchase_fct['orderdate'])
+
+    # Step 3: Look up SupplierKey and ProductKey in the supplier_dim and product_dim indexes
+    purchase_fct = resolve_keys(purchase_fct, {'supplierid': supplier_keys, 'productid': product_keys}, unmatched)
+
+    # Step 4: Select relevant columns for the final purchase_fct
     purchase_fct = purchase_fct[['TimeKey', 'SupplierKey', 'ProductKey', 'quantity', 'unitprice', 'discount', 'tax', 'totalamount']]
 
-    # Step 6: Rename columns to align with the fact table schema
+    # Step 5: Rename columns to align with the fact table schema
     purchase_fct.columns = ['TimeKey', 'SupplierKey', 'ProductKey', 'Quantity', 'UnitPrice', 'Discount', 'Tax', 'TotalAmount']
 
-    # Step 7: Return the final purchase_fct table
+    # Step 6: Return the final purchase_fct table
     return purchase_fct
 
 
 
 
 
-def create_inventory_fact_table(transformed_tables, product_dim, warehouse_dim):
+def create_inventory_fact_table(transformed_tables, product_dim, warehouse_dim, unmatched=None):
     # Step 1: Load the 'inventory' table
     inventory_fct = transformed_tables['inventory']
 
-    # Step 2: Merge with 'product' and 'warehouse' tables
-    inventory_fct = pd.merge(inventory_fct, transformed_tables['product'], left_on='productid', right_on='productid', how='inner')
-    inventory_fct = pd.merge(inventory_fct, transformed_tables['warehouse'], left_on='warehouseid', right_on='warehouseid', how='inner')
-
-    # Step 3: Map ProductKey from product_dim and WarehouseKey from warehouse_dim
-    inventory_fct = pd.merge(inventory_fct, product_dim, left_on='productid', right_on='ProductID', how='inner')
-    inventory_fct = pd.merge(inventory_fct, warehouse_dim, left_on='warehouseid', right_on='WarehouseID', how='inner')
+    # Step 2: Look up ProductKey and WarehouseKey in the product_dim and warehouse_dim indexes
+    # (the dimensions hold every product and warehouse, so the raw tables need no join)
+    inventory_fct = resolve_keys(
+        inventory_fct,
+        {
+            'productid': build_key_index(product_dim, 'ProductID', 'ProductKey'),
+            'warehouseid': build_key_index(warehouse_dim, 'WarehouseID', 'WarehouseKey'),
+        },
+        unmatched or FACT_UNMATCHED_KEYS['inventory_fct']
+    )
 
-    # Step 4: Select relevant columns for the final inventory_fct
+    # Step 3: Select relevant columns for the final inventory_fct
     inventory_fct = inventory_fct[['ProductKey', 'WarehouseKey', 'quantity', 'minimumstocklevel', 'maximumstocklevel', 'reorderpoint']]
 
-    # Step 5: Rename columns to match the fact table schema
+    # Step 4: Rename columns to match the fact table schema
     inventory_fct.columns = ['ProductKey', 'WarehouseKey', 'Quantity', 'MinimumStockLevel', 'MaximumStockLevel', 'ReorderPoint']
 
-    # Step 6: Return the final inventory_fct table
+    # Step 5: Return the final inventory_fct table
     return inventory_fct
 
 
 
-def create_return_fact_table(transformed_tables, customer_dim, product_dim, time_dim):
+def create_return_fact_table(transformed_tables, customer_dim, product_dim, unmatched=None):
     # Step 1: Merge 'returns' and 'returndetail' on 'returnid'
     return_fct = pd.merge(transformed_tables['returns'], transformed_tables['returndetail'], on='returnid', how='inner')
+    count_dropped('no_header', len(transformed_tables['returndetail']) - len(return_fct))
+
+    customer_keys = build_key_index(customer_dim, 'CustomerID', 'CustomerKey')
+    product_keys = build_key_index(product_dim, 'ProductID', 'ProductKey')
+    return return_fact_rows(return_fct, customer_keys, product_keys, unmatched or FACT_UNMATCHED_KEYS['return_fct'])
 
-    # Step 2: Merge with 'customer' and 'product' tables to access additional details
-    return_fct = pd.merge(return_fct, transformed_tables['customer'], left_on='customerid', right_on='customerid', how='inner')
-    return_fct = pd.merge(return_fct, transformed_tables['product'], left_on='productid', right_on='productid', how='inner')
 
-    # Step 3: Map CustomerKey from customer_dim and ProductKey from product_dim
-    return_fct = pd.merge(return_fct, customer_dim[['CustomerID', 'CustomerKey']], left_on='customerid', right_on='CustomerID', how='inner')
-    return_fct = pd.merge(return_fct, product_dim[['ProductID', 'ProductKey']], left_on='productid', right_on='ProductID', how='inner')
+def iter_return_fact_chunks(transformed_tables, detail_chunks, customer_dim, product_dim, unmatched=None):
+    """Build return_fct chunk by chunk from streamed 'returndetail' chunks."""
+    returns = transformed_tables['returns'].set_index('returnid')
+    customer_keys = build_key_index(customer_dim, 'CustomerID', 'CustomerKey')
+    product_keys = build_key_index(product_dim, 'ProductID', 'ProductKey')
+    for chunk in detail_chunks:
+        yield return_fact_rows(
+            join_header(chunk, returns, 'returnid'), customer_keys, product_keys,
+            unmatched or FACT_UNMATCHED_KEYS['return_fct']
+        )
 
-    # Step 4: Map TimeKey from time_dim based on 'ReturnDate'
-    return_fct['ReturnDate'] = pd.to_datetime(return_fct['returndate'])
-    return_fct = pd.merge(return_fct, time_dim[['Date', 'TimeKey']], left_on='ReturnDate', right_on='Date', how='left')
 
-    # Step 5: Select and rename relevant columns to match the fact table structure
+def return_fact_rows(return_fct, customer_keys, product_keys, unmatched):
+    # Step 2: Look up CustomerKey and ProductKey in the customer_dim and product_dim indexes
+    # (the dimensions hold every customer and product, so the raw tables need no join)
+    return_fct = resolve_keys(return_fct, {'customerid': customer_keys, 'productid': product_keys}, unmatched)
+
+    # Step 3: TimeKey straight from 'returndate' (YYYYMMDD)
+    return_fct['TimeKey'] = date_to_time_key(return_fct['returndate'])
+
+    # Step 4: Select and rename relevant columns to match the fact table structure
     return_fct = return_fct[['TimeKey', 'CustomerKey', 'ProductKey', 'quantity', 'totalamount', 'refundamount']]
     return_fct.columns = ['TimeKey', 'CustomerKey', 'ProductKey', 'Quantity', 'TotalAmount', 'RefundAmount']
 
-    # Step 6: Return the final return_fct table
+    # Step 5: Return the final return_fct table
     return return_fct
 
+
+
+# Builder of each node of STAR_SCHEMA_NODES
+DIMENSION_BUILDERS = {
+    'product_dim': create_product_dim,
+    'supplier_dim': create_supplier_dim,
+    'customer_dim': create_customer_dim,
+    'warehouse_dim': create_warehouse_dim,
+    'time_dim': create_time_dim,
+}
+
+FACT_BUILDERS = {
+    'sales_fct': create_sales_fact_table,
+    'purchase_fct': create_purchase_fact_table,
+    'inventory_fct': create_inventory_fact_table,
+    'return_fct': create_return_fact_table,
+}
+
+# Entry of last_surrogates_keys each dimension builder continues from
+DIMENSION_KEY_COLUMNS = {
+    'product_dim': 'ProductKey',
+    'supplier_dim': 'SupplierKey',
+    'customer_dim': 'CustomerKey',
+    'warehouse_dim': 'WarehouseKey',
+    'time_dim': 'TimeKey',
+}
+
+# Facts that can be built from their detail table streamed in chunks (see transform_data's
+# `fact_chunk_size`): detail table and chunk builder, called like the fact builder plus the chunks
+STREAMED_FACTS = {
+    'sales_fct': ('salesorderdetail', iter_sales_fact_chunks),
+    'purchase_fct': ('purchaseorderdetail', iter_purchase_fact_chunks),
+    'return_fct': ('returndetail', iter_return_fact_chunks),
+}
+
+
+def register_builder_aliases():
+    """Let each build:<node> step also be profiled by the function name of its builder (e.g. create_sales_fact_table)."""
+    for name, builder in {**DIMENSION_BUILDERS, **FACT_BUILDERS}.items():
+        register_step_alias(f"build:{name}", builder.__name__)
+    for name, (_, chunk_builder) in STREAMED_FACTS.items():
+        register_step_alias(f"build:{name}", chunk_builder.__name__)
+
+
+register_builder_aliases()
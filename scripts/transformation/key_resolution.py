@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from ..run_report import count_dropped
+
+# How fact rows whose natural key is not in the dimension are handled:
+# 'left' keeps them with a missing key, 'inner' drops them, 'error' raises
+UNMATCHED_MODES = ('left', 'inner', 'error')
+
+
+def build_key_index(dim, natural_key, key_col):
+    """
+    Hash index of a dimension, mapping its natural keys to their surrogate keys.
+
+    Build it once per dimension and reuse it for every fact (and every chunk of a
+    streamed fact); only the two key columns are kept, not the dimension's attributes.
+
+    Returns:
+    - pd.Series: surrogate keys named `key_col`, indexed by natural key
+    """
+    keys = dim[[natural_key, key_col]].drop_duplicates(subset=[natural_key], keep='last')
+    return pd.Series(keys[key_col].to_numpy(), index=pd.Index(keys[natural_key], name=natural_key), name=key_col)
+
+
+def resolve_keys(fact, key_indexes, unmatched='left'):
+    """
+    Add surrogate key columns to a fact table through dimension key indexes.
+
+    `key_indexes` maps fact columns holding natural keys to the index (see `build_key_index`)
+    of their dimension; each lookup is one vectorized `Index.get_indexer` probe instead of a
+    merge. The key columns are named after their index. With `unmatched='left'`, keys that
+    are not found are left missing (as a left merge would); 'inner' drops those rows and
+    'error' raises a ValueError naming them.
+
+    Returns:
+    - pd.DataFrame: `fact` with the key columns, in its original row order
+    """
+    if unmatched not in UNMATCHED_MODES:
+        raise ValueError(f"Unknown unmatched mode '{unmatched}', expected one of {UNMATCHED_MODES}")
+
+    positions = {}
+    matched = np.ones(len(fact), dtype=bool)
+    for column, key_index in key_indexes.items():
+        positions[column] = key_index.index.get_indexer(fact[column])
+        found = positions[column] >= 0
+
+        if unmatched == 'error' and not found.all():
+            missing = pd.unique(fact.loc[~found, column])
+            raise ValueError(f"{len(missing)} values of '{column}' have no {key_index.name}, e.g. {list(missing[:5])}")
+        matched &= found
+
+    # Drop unmatched rows before taking the keys, so the key columns keep their integer type
+    if unmatched == 'inner' and not matched.all():
+        count_dropped('unmatched_key', (~matched).sum())
+        fact = fact.loc[matched]
+        positions = {column: column_positions[matched] for column, column_positions in positions.items()}
+
+    # Positions of -1 (left mode only) become NaN, like the unmatched rows of a left merge
+    return fact.assign(**{
+        key_index.name: pd.api.extensions.take(key_index.to_numpy(), positions[column], allow_fill=True)
+        for column, key_index in key_indexes.items()
+    })
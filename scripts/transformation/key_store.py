@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+# Dimensions whose surrogate keys are kept stable by the key store: name -> (natural key, surrogate key)
+KEYED_DIMENSIONS = {
+    'product_dim': ('ProductID', 'ProductKey'),
+    'supplier_dim': ('SupplierID', 'SupplierKey'),
+    'customer_dim': ('CustomerID', 'CustomerKey'),
+    'warehouse_dim': ('WarehouseID', 'WarehouseKey'),
+}
+
+# Dimensions are built on several threads; they take turns on the shared SQLite connection
+STORE_LOCK = threading.Lock()
+
+
+def open_key_store(path):
+    """
+    Open (creating it if needed) the SQLite file mapping natural keys to surrogate keys.
+
+    Each dimension member is stored with the hash of its attributes, so the next run can
+    tell unchanged members from changed ones without reading the warehouse.
+    Changes are only kept once the caller commits, i.e. after the warehouse load succeeded.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    store = sqlite3.connect(path, check_same_thread=False)
+    store.execute("""
+    CREATE TABLE IF NOT EXISTS key_map (
+        dimension TEXT NOT NULL,
+        natural_key INTEGER NOT NULL,
+        surrogate_key INTEGER NOT NULL,
+        row_hash INTEGER NOT NULL,
+        PRIMARY KEY (dimension, natural_key)
+    );
+    """)
+    store.commit()
+    return store
+
+
+def row_hashes(df, columns):
+    """64-bit hash of each row's `columns`, as signed integers so SQLite can store them."""
+    return pd.util.hash_pandas_object(df[columns], index=False).values.view('int64')
+
+
+def assign_surrogate_keys(store, dimension, df, natural_key, key_col, last_surrogates_keys):
+    """
+    Give each row of a dimension its surrogate key from the key store.
+
+    Members seen in earlier runs keep their key; only new natural keys get new ones,
+    numbered after `last_surrogates_keys[key_col]`. Only new members and members whose
+    attributes changed since the last run are returned, so the rows to load scale
+    with the change rather than with the size of the dimension.
+
+    Returns:
+    - tuple: (DataFrame of new/changed rows with `key_col`, last_surrogates_keys)
+    """
+    df = df.drop_duplicates(subset=[natural_key], keep='last').copy()
+    attributes = [col for col in df.columns if col != key_col]
+    df['_row_hash'] = row_hashes(df, attributes)
+
+    with STORE_LOCK:
+        known = pd.read_sql_query(
+            "SELECT natural_key, surrogate_key, row_hash FROM key_map WHERE dimension = ?",
+            store, params=(dimension,)
+        )
+    known = known.set_index('natural_key')
+
+    df[key_col] = df[natural_key].map(known['surrogate_key'])
+    previous_hash = df[natural_key].map(known['row_hash'])
+
+    # New natural keys continue the numbering (the store is checked too, in case the metadata was reset)
+    new_members = df[key_col].isna()
+    last_key = int(max(last_surrogates_keys[key_col], known['surrogate_key'].max() if len(known) else 0))
+    df.loc[new_members, key_col] = range(last_key + 1, last_key + new_members.sum() + 1)
+    df[key_col] = df[key_col].astype('int64')
+    last_surrogates_keys[key_col] = last_key + int(new_members.sum())
+
+    changed = df[new_members | (previous_hash != df['_row_hash'])]
+
+    with STORE_LOCK:
+        store.executemany(
+            "INSERT OR REPLACE INTO key_map (dimension, natural_key, surrogate_key, row_hash) VALUES (?, ?, ?, ?)",
+            [
+                (dimension, int(natural), int(key), int(row_hash))
+                for natural, key, row_hash in zip(changed[natural_key], changed[key_col], changed['_row_hash'])
+            ]
+        )
+
+    print(f"{dimension}: {int(new_members.sum())} new, {len(changed) - int(new_members.sum())} changed, "
+          f"{len(df) - len(changed)} unchanged members")
+
+    return changed.drop(columns=['_row_hash']), last_surrogates_keys
+
+
+def key_map(store, dimension, natural_key, key_col):
+    """Every natural key -> surrogate key pair of a dimension, for resolving fact table keys."""
+    with STORE_LOCK:
+        return pd.read_sql_query(
+            f"SELECT natural_key AS {natural_key}, surrogate_key AS {key_col} FROM key_map WHERE dimension = ?",
+            store, params=(dimension,)
+        )
@@ -0,0 +1,40 @@
+from .data_cleaning_helpers import apply_cleaning_plan
+from .data_transformation_helpers import TABLE_TRANSFORMS
+from .dim_fact_creation import STAR_SCHEMA_NODES
+
+
+def plan_key_columns(plan):
+    """Columns a cleaning plan needs to decide which rows to keep and how to fill them."""
+    columns = plan.get('primary_key', []) + plan.get('required', [])
+    for target, key in plan.get('backfill', {}).items():
+        columns += [target, key]
+    for group_fill in plan.get('fill_by_group', []):
+        columns += group_fill['group_by']
+    return columns
+
+
+def needed_columns(nodes=STAR_SCHEMA_NODES):
+    """
+    Raw columns read by the star schema: {raw table: [columns], or None for every column}.
+
+    A table's columns are those its dimension/fact builders read plus the keys its cleaning
+    plan needs; plan steps on the other columns are skipped. Tables with a custom transform
+    (see `register_transform`) are read whole, since their needs are unknown. Raw tables
+    missing from the result are not used at all.
+    """
+    columns = {}
+    for node in nodes.values():
+        for table_name, node_columns in node['tables'].items():
+            columns.setdefault(table_name, []).extend(node_columns)
+
+    projection = {}
+    for table_name, table_columns in columns.items():
+        transform = TABLE_TRANSFORMS.get(table_name)
+        if getattr(transform, 'func', None) is not apply_cleaning_plan:
+            projection[table_name] = None
+            continue
+
+        table_columns = plan_key_columns(transform.keywords['plan']) + table_columns
+        projection[table_name] = list(dict.fromkeys(table_columns))
+
+    return projection
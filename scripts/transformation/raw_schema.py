@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+# Nullable, so IDs missing in the source still fit. IDs are read as 64-bit integers, which
+# cannot wrap, and then downcast to COMPACT_ID_DTYPE when every value fits.
+ID_DTYPE = 'Int64'
+COMPACT_ID_DTYPE = 'Int32'
+
+# Compact dtypes of the raw tables, applied as they are read: integer IDs are downcast,
+# low-cardinality text columns become categories and dates are parsed once.
+# Master-data text that ends up in the dimensions (e.g. manufacturer/supplier country)
+# is read as plain strings.
+RAW_SCHEMAS = {
+    'inventory': {
+        'ids': ['productid', 'warehouseid'],
+        'dates': ['lastreorderdate', 'expecteddeliverydate'],
+    },
+    'manufacturer': {
+        'ids': ['manufacturerid'],
+    },
+    'payment': {
+        'ids': ['paymentid', 'orderid'],
+        'categories': ['paymentmethod', 'status'],
+        'dates': ['paymentdate'],
+    },
+    'purchaseorder': {
+        'ids': ['orderid', 'supplierid'],
+        'categories': ['status', 'paymentmethod', 'paymentstatus'],
+        'dates': ['orderdate', 'expecteddeliverydate', 'actualdeliverydate'],
+    },
+    'purchaseorderdetail': {
+        'ids': ['orderid', 'productid'],
+        'categories': ['deliverystatus'],
+    },
+    'returndetail': {
+        'ids': ['returnid', 'productid'],
+    },
+    'returns': {
+        'ids': ['returnid', 'orderid', 'customerid'],
+        'categories': ['refundmethod', 'refundstatus'],
+        'dates': ['returndate'],
+    },
+    'salesorder': {
+        'ids': ['orderid', 'customerid'],
+        'categories': ['status', 'paymentmethod', 'paymentstatus'],
+        'dates': ['orderdate', 'expecteddeliverydate', 'actualdeliverydate'],
+    },
+    'salesorderdetail': {
+        'ids': ['orderid', 'productid'],
+        'categories': ['deliverystatus'],
+    },
+    'shipment': {
+        'ids': ['shipmentid', 'warehouseid', 'orderid'],
+        'categories': ['status', 'carrier'],
+        'dates': ['shipmentdate', 'estimatedarrivaldate', 'actualarrivaldate'],
+    },
+    'shipmentdetail': {
+        'ids': ['shipmentid', 'productid'],
+    },
+}
+
+
+def raw_dtypes(table_name):
+    """{column: dtype} of the ID and category columns of a raw table."""
+    schema = RAW_SCHEMAS.get(table_name, {})
+    dtypes = {col: ID_DTYPE for col in schema.get('ids', [])}
+    dtypes.update({col: 'category' for col in schema.get('categories', [])})
+    return dtypes
+
+
+def csv_read_options(table_name, columns=None):
+    """
+    Keyword arguments for `pd.read_csv` that read a raw table straight into its compact dtypes.
+
+    Pass the `columns` that will be read, so dates outside them are not requested.
+    """
+    options = {'dtype': raw_dtypes(table_name)}
+    dates = RAW_SCHEMAS.get(table_name, {}).get('dates', [])
+    if columns is not None:
+        dates = [col for col in dates if col in columns]
+    if dates:
+        options['parse_dates'] = dates
+    return options
+
+
+def downcast_ids(df, table_name):
+    """
+    Downcast the ID columns of a raw table to COMPACT_ID_DTYPE where their values fit.
+
+    Columns holding an ID outside its range keep their 64-bit dtype, so no key ever wraps around.
+    """
+    info = np.iinfo(pd.api.types.pandas_dtype(COMPACT_ID_DTYPE).numpy_dtype)
+    for col in RAW_SCHEMAS.get(table_name, {}).get('ids', []):
+        if col not in df.columns or df[col].dtype == COMPACT_ID_DTYPE:
+            continue
+        low, high = df[col].min(), df[col].max()
+        if pd.isna(low) or (info.min <= low and high <= info.max):
+            df[col] = df[col].astype(COMPACT_ID_DTYPE)
+    return df
+
+
+def apply_raw_schema(df, table_name, downcast=True):
+    """
+    Convert a raw table to its compact dtypes.
+
+    Columns already read with the right dtype (e.g. through `csv_read_options`) are left
+    alone; dates the CSV parser could not read are parsed here, invalid ones becoming NaT.
+    With `downcast`, ID columns are then narrowed where their values allow (see
+    `downcast_ids`); chunks of a streamed table pass False, so every chunk has the same dtypes.
+    """
+    dtypes = {
+        col: dtype for col, dtype in raw_dtypes(table_name).items()
+        if col in df.columns and df[col].dtype != dtype
+    }
+    if dtypes:
+        df = df.astype(dtypes)
+
+    for col in RAW_SCHEMAS.get(table_name, {}).get('dates', []):
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    if downcast:
+        df = downcast_ids(df, table_name)
+    return df
@@ -1,84 +1,377 @@
 import pandas as pd
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 # Import your helper functions and transformations
 from .data_transformation_helpers import *
 from .dim_fact_creation import *
+from .data_cleaning_helpers import apply_cleaning_plan
+from .key_resolution import UNMATCHED_MODES
+from .key_store import KEYED_DIMENSIONS, key_map
+from .raw_schema import RAW_SCHEMAS, apply_raw_schema, csv_read_options
+from .projection import needed_columns
+from .dag import run_graph, print_graph_report
+from .transform_cache import (
+    DEFAULT_CACHE_MAX_BYTES, hash_file, hash_values, transform_version, read_cached, write_cached
+)
+from ..profiling import profiling_active
+from ..run_report import add_steps, call_reported, count_dropped, report_step, run_report_active, tracing_memory
+from ..storage import TableWriter, iter_table_chunks, list_tables, read_table, write_table, table_path
 
-def load_csv_files(csv_dir):
+def read_raw_table(csv_dir, table_name, storage_format='csv', columns=None):
+    """Read a raw table (only `columns`, when given) in the compact dtypes of its RAW_SCHEMAS entry."""
+    table = read_table(csv_dir, table_name, storage_format, columns, **csv_read_options(table_name, columns))
+    return apply_raw_schema(table, table_name)
+
+def transform_table(csv_dir, table_name, storage_format='csv', columns=None):
+    """Read one raw table and apply its registered transform (runs in a worker process)."""
+    with report_step(f"transform:{table_name}") as step:
+        raw = read_raw_table(csv_dir, table_name, storage_format, columns)
+        step['rows_in'] = len(raw)
+        table = TABLE_TRANSFORMS[table_name](raw)
+        step['rows_out'] = len(table)
+    return table
+
+def table_primary_key(table_name):
+    """Primary key of a raw table's cleaning plan ([] for a custom transform)."""
+    transform = TABLE_TRANSFORMS[table_name]
+    if getattr(transform, 'func', None) is apply_cleaning_plan:
+        return transform.keywords['plan'].get('primary_key', [])
+    return []
+
+def drop_seen_keys(chunk, primary_key, seen):
+    """
+    Drop the rows of a raw chunk whose primary key was already in an earlier chunk, and add
+    the chunk's keys to `seen`. Rows with a null key are left to the cleaning plan.
+    """
+    known = chunk[primary_key].notna().all(axis=1).to_numpy()
+    keys = list(zip(*(chunk[col].to_numpy(dtype=object) for col in primary_key)))
+    repeated = [is_known and key in seen for is_known, key in zip(known, keys)]
+    seen.update(key for is_known, key in zip(known, keys) if is_known)
+    if any(repeated):
+        count_dropped('duplicate_key', sum(repeated))
+        chunk = chunk.loc[~pd.Series(repeated, index=chunk.index)]
+    return chunk
+
+def iter_transformed_chunks(csv_dir, table_name, storage_format='csv', chunksize=50000, columns=None):
+    """
+    Stream a raw table in chunks of `chunksize` rows and apply its transform to each chunk.
+
+    Rows repeating a primary key of an earlier chunk are dropped before the transform, which
+    removes the duplicates within the chunk, so the first occurrence of every key is kept as
+    when the table is cleaned whole. Only the keys are kept in memory between chunks.
+    """
+    read_options = csv_read_options(table_name, columns)
+    primary_key = table_primary_key(table_name)
+    seen = set()
+    for chunk in iter_table_chunks(csv_dir, table_name, storage_format, chunksize, columns, **read_options):
+        chunk = apply_raw_schema(chunk, table_name, downcast=False)
+        if primary_key:
+            chunk = drop_seen_keys(chunk, primary_key, seen)
+        yield TABLE_TRANSFORMS[table_name](chunk)
+
+def table_cache_keys(csv_dir, table_names, storage_format='csv', projection=None):
+    """
+    Cache key of each raw table: the hash of its file, its raw schema, the columns read
+    (see `needed_columns`) and the version of its transform.
+    """
+    projection = projection or {}
+    return {
+        table_name: hash_values(
+            hash_file(table_path(csv_dir, table_name, storage_format)), RAW_SCHEMAS.get(table_name),
+            projection.get(table_name), transform_version(TABLE_TRANSFORMS[table_name])
+        )
+        for table_name in table_names
+    }
+
+def transform_tables(csv_dir, table_names, storage_format='csv', workers=1, cache_dir=None, cache_keys=None,
+                     cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, projection=None):
+    """
+    Transform raw tables, in parallel on a process pool when `workers` > 1.
+
+    The per-table transforms are independent, so they scale with the number of cores.
+    Each worker reads its own table, so only the cleaned tables are sent back.
+
+    With a `cache_dir`, tables whose `cache_keys` entry (see `table_cache_keys`) is
+    already cached are not transformed again. With a `projection` ({table: columns}),
+    only those columns of the raw tables are read.
+    """
+    projection = projection or {}
     tables = {}
-    for filename in os.listdir(csv_dir):
-        if filename.endswith('.csv'):
-            table_name = filename.replace('.csv', '')
-            file_path = os.path.join(csv_dir, filename)
-            tables[table_name] = pd.read_csv(file_path)
-    return tables
-
-def save_transformed_data(tables_dict, save_path):
+    if cache_dir is not None:
+        for table_name in table_names:
+            cached = read_cached(cache_dir, table_name, cache_keys[table_name])
+            if cached is not None:
+                tables[table_name] = cached
+        print(f"Transform cache: {len(tables)} of {len(table_names)} raw tables unchanged")
+
+    pending = [table_name for table_name in table_names if table_name not in tables]
+
+    if workers <= 1 or len(pending) <= 1:
+        transformed = {
+            table_name: transform_table(csv_dir, table_name, storage_format, projection.get(table_name))
+            for table_name in pending
+        }
+    elif run_report_active() or profiling_active():
+        # Workers record their steps in a report of their own, merged into the run's report
+        # (and into the steps checked against the profiled ones)
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = {
+                table_name: executor.submit(
+                    call_reported, transform_table, tracing_memory(),
+                    csv_dir, table_name, storage_format, projection.get(table_name)
+                )
+                for table_name in pending
+            }
+            transformed = {}
+            for table_name, future in futures.items():
+                transformed[table_name], steps = future.result()
+                add_steps(steps)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = {
+                table_name: executor.submit(
+                    transform_table, csv_dir, table_name, storage_format, projection.get(table_name)
+                )
+                for table_name in pending
+            }
+            transformed = {table_name: future.result() for table_name, future in futures.items()}
+
+    if cache_dir is not None:
+        for table_name, table in transformed.items():
+            write_cached(cache_dir, table_name, cache_keys[table_name], table, cache_max_bytes)
+
+    tables.update(transformed)
+    return {table_name: tables[table_name] for table_name in table_names}
+
+def node_cache_keys(table_keys, last_surrogates_keys, key_store=None, unmatched_keys=None):
+    """
+    Cache key of each builder of STAR_SCHEMA_NODES.
+
+    It covers the builder's version, the keys of its input tables and dimensions, the
+    surrogate key it numbers from and its handling of unmatched keys, so a node is only
+    rebuilt when one of its inputs changed. `unmatched_keys` is the policy passed to
+    `build_star_schema`.
+    """
+    unmatched_keys = {**FACT_UNMATCHED_KEYS, **(unmatched_keys or {})}
+    node_keys = {}
+
+    def node_key(name):
+        if name not in node_keys:
+            node = STAR_SCHEMA_NODES[name]
+            builder = DIMENSION_BUILDERS.get(name) or FACT_BUILDERS[name]
+            node_keys[name] = hash_values(
+                transform_version(builder),
+                [table_keys[table_name] for table_name in node['tables']],
+                [node_key(dim) for dim in node['depends_on']],
+                last_surrogates_keys.get(DIMENSION_KEY_COLUMNS.get(name)),
+                key_store is not None,
+                unmatched_keys.get(name),
+            )
+        return node_keys[name]
+
+    for name in STAR_SCHEMA_NODES:
+        node_key(name)
+    return node_keys
+
+def build_star_schema(transformed_tables, last_surrogates_keys, key_store=None, workers=1, nodes=None, results=None,
+                      cache_dir=None, table_keys=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, detail_chunks=None,
+                      unmatched_keys=None):
+    """
+    Build the dimension and fact tables declared in STAR_SCHEMA_NODES as a dependency graph.
+
+    Independent builders run concurrently on `workers` threads; each fact starts as soon as
+    the dimensions it needs are built. Pass `nodes` (and the `results` of an earlier run)
+    to re-run single nodes; dependencies found in `results` are reused. The time of every
+    node and the critical path of the run are printed.
+
+    With a `cache_dir` and the `table_keys` of the cleaned tables, nodes whose inputs are
+    unchanged are read from the cache. Key-store dimensions always run, since they
+    record their members in the store.
+
+    Facts listed in `detail_chunks` ({fact name: chunks of its cleaned detail table}, see
+    STREAMED_FACTS) are returned as lazy iterators of fact chunks instead of DataFrames;
+    the detail rows are joined chunk by chunk against the in-memory header and dimension
+    lookups. These nodes are not cached, and their time is spent by whoever consumes them.
+
+    `unmatched_keys` ({fact name: 'left' | 'inner' | 'error'}, see UNMATCHED_MODES)
+    overrides FACT_UNMATCHED_KEYS, the handling of fact rows whose natural key is not in
+    their dimension.
+
+    Returns:
+    - tuple: ({node name: DataFrame}, last_surrogates_keys)
+    """
+    graph = {name: node['depends_on'] for name, node in STAR_SCHEMA_NODES.items()}
+
+    def dimension_keys(name, results):
+        # Fact tables need the keys of every member, not just of the new/changed rows
+        if key_store is not None and name in KEYED_DIMENSIONS:
+            return key_map(key_store, name, *KEYED_DIMENSIONS[name])
+        return results[name]
+
+    unmatched_keys = {**FACT_UNMATCHED_KEYS, **(unmatched_keys or {})}
+    for fact_name, mode in unmatched_keys.items():
+        if mode not in UNMATCHED_MODES:
+            raise ValueError(f"Unknown unmatched-key mode '{mode}' for '{fact_name}', expected one of {UNMATCHED_MODES}")
+
+    node_keys = (
+        node_cache_keys(table_keys, last_surrogates_keys, key_store, unmatched_keys) if cache_dir is not None else {}
+    )
+
+    detail_chunks = detail_chunks or {}
+
+    def build_node(name, results):
+        if name in detail_chunks:
+            dims = [dimension_keys(dim, results) for dim in graph[name]]
+            _, chunk_builder = STREAMED_FACTS[name]
+            return chunk_builder(transformed_tables, detail_chunks[name], *dims, unmatched=unmatched_keys.get(name)), {}
+        if name in FACT_BUILDERS:
+            dims = [dimension_keys(dim, results) for dim in graph[name]]
+            return FACT_BUILDERS[name](transformed_tables, *dims, unmatched=unmatched_keys.get(name)), {}
+        if name in KEYED_DIMENSIONS:
+            table, _ = DIMENSION_BUILDERS[name](transformed_tables, last_surrogates_keys, key_store)
+        else:
+            table, _ = DIMENSION_BUILDERS[name](transformed_tables, last_surrogates_keys)
+        key_column = DIMENSION_KEY_COLUMNS[name]
+        return table, {key_column: last_surrogates_keys[key_column]}
+
+    def run_node(name, results):
+        # Streamed detail tables are not in memory, so their rows are not counted in
+        rows_in = sum(
+            len(transformed_tables[table_name]) for table_name in STAR_SCHEMA_NODES[name]['tables']
+            if table_name in transformed_tables
+        )
+        with report_step(f"build:{name}", rows_in) as step:
+            table = run_cached_node(name, results)
+            if isinstance(table, pd.DataFrame):
+                step['rows_out'] = len(table)
+        return table
+
+    def run_cached_node(name, results):
+        cacheable = (
+            cache_dir is not None
+            and name not in detail_chunks
+            and not (key_store is not None and name in KEYED_DIMENSIONS)
+        )
+        if cacheable:
+            cached = read_cached(cache_dir, name, node_keys[name])
+            if cached is not None:
+                # Cached dimensions also carry the surrogate key they advanced to
+                table, key_updates = cached
+                last_surrogates_keys.update(key_updates)
+                print(f"'{name}' inputs unchanged, reused from the transform cache")
+                return table
+
+        table, key_updates = build_node(name, results)
+        if cacheable:
+            write_cached(cache_dir, name, node_keys[name], (table, key_updates), cache_max_bytes)
+        return table
+
+    start = time.perf_counter()
+    results, timings = run_graph(graph, run_node, workers, nodes, results)
+    print_graph_report(graph, timings, time.perf_counter() - start)
+
+    return results, last_surrogates_keys
+
+def save_transformed_data(tables_dict, save_path, storage_format='csv'):
     os.makedirs(save_path, exist_ok=True)
     for table_name, table_df in tables_dict.items():
-        table_filename = f"{table_name}.csv"
-        table_filepath = os.path.join(save_path, table_filename)
-        table_df.to_csv(table_filepath, index=False)
+        with report_step(f"save:{table_name}") as step:
+            if isinstance(table_df, pd.DataFrame):
+                table_filepath = write_table(table_df, save_path, table_name, storage_format)
+                step['rows_in'] = step['rows_out'] = len(table_df)
+            else:
+                # Chunked fact tables are written as their chunks are built
+                rows = 0
+                with TableWriter(save_path, table_name, storage_format) as writer:
+                    for chunk in table_df:
+                        writer.write(chunk)
+                        rows += len(chunk)
+                table_filepath = writer.path
+                step['rows_in'] = step['rows_out'] = rows
         print(f"Table '{table_name}' saved at {table_filepath}")
 
 
 
-def transform_data(csv_dir, output_dir, last_surrogates_keys):
+def transform_data(csv_dir, output_dir, last_surrogates_keys, storage_format='csv', key_store=None, workers=1,
+                   build_workers=1, cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, fact_chunk_size=None,
+                   unmatched_keys=None):
+    """
+    Clean the raw tables and build the star-schema dimension and fact tables.
+
+    The star-schema tables are returned so they can be handed straight to the loader.
+    Writing them to `output_dir` is optional (pass None to skip it) and only needed
+    for auditing/debugging or a loader that reads from disk.
+
+    With a `key_store` (see `open_key_store`), the product, supplier, customer and warehouse
+    dimensions keep their surrogate keys across runs and only contain new or changed
+    members; fact tables resolve their keys against the full key map. The caller commits
+    the store once the tables are loaded.
+
+    Only the raw tables and columns read by the dimension and fact builders are read (see
+    `needed_columns`) and transformed, on `workers` processes. The dimensions and facts are
+    then built on `build_workers` threads (see `build_star_schema`).
+
+    With a `cache_dir`, cleaned tables and built nodes are cached under a hash of their
+    raw files and code; only what depends on a changed input is recomputed. The cache is
+    trimmed to `cache_max_bytes`, least recently used entries first.
+
+    With `fact_chunk_size`, the order detail tables are never fully loaded: they are
+    streamed in chunks of that many rows and the sales, purchase and return facts are
+    returned as iterators of chunks (or, with an `output_dir`, written out chunk by chunk
+    and streamed back from there), so their memory use does not grow with the detail tables.
+
+    `unmatched_keys` overrides, per fact, how rows with a natural key missing from their
+    dimension are handled (see `build_star_schema`).
+
+    Returns:
+    - tuple: ({table_name: DataFrame}, last_surrogates_keys)
+    """
     last_surrogates_keys = last_surrogates_keys
 
-    tables = load_csv_files(csv_dir)
-    transformed_tables = {}
-
-    # Apply transformations
-    transformed_tables['category'] = transform_category(tables['category'])
-    transformed_tables['customer'] = transform_customer(tables['customer'])
-    transformed_tables['department'] = transform_department(tables['department'])
-    transformed_tables['employee'] = transform_employee(tables['employee'])
-    transformed_tables['inventory'] = transform_inventory(tables['inventory'])
-    transformed_tables['location'] = transform_location(tables['location'])
-    transformed_tables['manufacturer'] = transform_manufacturer(tables['manufacturer'])
-    transformed_tables['payment'] = transform_payment(tables['payment'])
-    transformed_tables['product'] = transform_product(tables['product'])
-    transformed_tables['purchaseorder'] = transform_purchaseorder(tables['purchaseorder'])
-    transformed_tables['purchaseorderdetail'] = transform_purchaseorderdetail(tables['purchaseorderdetail'])
-    transformed_tables['returndetail'] = transform_returndetail(tables['returndetail'])
-    transformed_tables['returns'] = transform_returns(tables['returns'])
-    transformed_tables['salesorder'] = transform_salesorder(tables['salesorder'])
-    transformed_tables['salesorderdetail'] = transform_salesorderdetail(tables['salesorderdetail'])
-    transformed_tables['shipment'] = transform_shipment(tables['shipment'])
-    transformed_tables['shipmentdetail'] = transform_shipmentdetail(tables['shipmentdetail'])
-    transformed_tables['supplier'] = transform_supplier(tables['supplier'])
-    transformed_tables['warehouse'] = transform_warehouse(tables['warehouse'])
-
-    # Create dimension tables
-    product_dim, last_surrogates_keys = create_product_dim(transformed_tables, last_surrogates_keys)
-    supplier_dim, last_surrogates_keys = create_supplier_dim(transformed_tables, last_surrogates_keys)
-    customer_dim, last_surrogates_keys = create_customer_dim(transformed_tables, last_surrogates_keys)
-    warehouse_dim, last_surrogates_keys = create_warehouse_dim(transformed_tables, last_surrogates_keys)
-    time_dim, last_surrogates_keys = create_time_dim(transformed_tables, last_surrogates_keys)
-
-    # Create fact tables
-    sales_fct = create_sales_fact_table(transformed_tables, time_dim, customer_dim, product_dim, last_surrogates_keys)
-    purchase_fct = create_purchase_fact_table(transformed_tables, time_dim, supplier_dim, product_dim)
-    inventory_fct = create_inventory_fact_table(transformed_tables, product_dim, warehouse_dim)
-    return_fct = create_return_fact_table(transformed_tables, customer_dim, product_dim, time_dim)
+    # Apply the registered transform of every raw table the star schema needs
+    projection = needed_columns()
+    needed_tables = sorted(projection)
+    available_tables = set(list_tables(csv_dir, storage_format))
+    missing_tables = [table_name for table_name in needed_tables if table_name not in available_tables]
+    if missing_tables:
+        raise FileNotFoundError(f"Raw tables missing from {csv_dir}: {', '.join(missing_tables)}")
+
+    # Detail tables of chunked facts are streamed instead of transformed in memory
+    detail_chunks = {}
+    if fact_chunk_size:
+        detail_chunks = {
+            fact_name: iter_transformed_chunks(
+                csv_dir, detail_table, storage_format, fact_chunk_size, projection[detail_table]
+            )
+            for fact_name, (detail_table, _) in STREAMED_FACTS.items()
+        }
+    streamed_tables = {detail_table for detail_table, _ in STREAMED_FACTS.values()} if fact_chunk_size else set()
+
+    table_keys = table_cache_keys(csv_dir, needed_tables, storage_format, projection) if cache_dir is not None else None
+    transformed_tables = transform_tables(
+        csv_dir, [table_name for table_name in needed_tables if table_name not in streamed_tables],
+        storage_format, workers, cache_dir, table_keys, cache_max_bytes, projection
+    )
+
+    # Create dimension and fact tables
+    star_tables, last_surrogates_keys = build_star_schema(
+        transformed_tables, last_surrogates_keys, key_store, build_workers,
+        cache_dir=cache_dir, table_keys=table_keys, cache_max_bytes=cache_max_bytes, detail_chunks=detail_chunks,
+        unmatched_keys=unmatched_keys
+    )
 
     # Combine all the tables to be saved
-    tables_to_save = {
-        'product_dim': product_dim,
-        'supplier_dim': supplier_dim,
-        'customer_dim': customer_dim,
-        'warehouse_dim': warehouse_dim,
-        'time_dim': time_dim,
-        'sales_fct': sales_fct,
-        'purchase_fct': purchase_fct,
-        'inventory_fct': inventory_fct,
-        'return_fct': return_fct
-    }
+    tables_to_save = {name: star_tables[name] for name in STAR_SCHEMA_NODES}
 
     # Save the transformed data
-    save_transformed_data(tables_to_save, output_dir)
+    if output_dir is not None:
+        save_transformed_data(tables_to_save, output_dir, storage_format)
+
+        # The chunk iterators were used up by the write; stream the saved tables back instead
+        for fact_name in detail_chunks:
+            tables_to_save[fact_name] = iter_table_chunks(output_dir, fact_name, storage_format, fact_chunk_size)
 
-    # Return the updated surrogate keys for the next iteration
-    return last_surrogates_keys
\ No newline at end of file
+    # Return the star-schema tables and the updated surrogate keys for the next iteration
+    return tables_to_save, last_surrogates_keys
\ No newline at end of file
@@ -0,0 +1,118 @@
+import os
+import pickle
+import hashlib
+import inspect
+from functools import lru_cache, partial
+
+# Bump to invalidate every cache entry, e.g. after changing a dependency
+CACHE_VERSION = 1
+
+# Directory of the transformation package, whose code is part of every cache key
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Size the cache directory is trimmed to, least recently used entries first
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+CACHE_EXTENSION = '.pkl'
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_values(*parts):
+    """Short stable hash of the repr of `parts`, used as cache key."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+@lru_cache(maxsize=None)
+def package_version():
+    """
+    Hash of the contents of every module of the transformation package.
+
+    Builders and transforms call shared helpers (cleaning helpers, key resolution, the raw
+    schema, ...), so a change to any of them must invalidate every entry.
+    """
+    files = sorted(name for name in os.listdir(PACKAGE_DIR) if name.endswith('.py'))
+    return hash_values(*[(name, hash_file(os.path.join(PACKAGE_DIR, name))) for name in files])
+
+
+def transform_version(transform):
+    """
+    Version of a transform function: its source code (and, for a partial, its arguments),
+    plus the code of the whole transformation package (see `package_version`).
+
+    Editing a transform, its cleaning plan or any helper of the package changes the version
+    and so invalidates its entries.
+    """
+    parts = [CACHE_VERSION, package_version()]
+    if isinstance(transform, partial):
+        parts.append(repr(transform.args))
+        parts.append(repr(sorted(transform.keywords.items())))
+        transform = transform.func
+
+    parts.append(f"{transform.__module__}.{transform.__qualname__}")
+    try:
+        parts.append(inspect.getsource(transform))
+    except (OSError, TypeError):
+        pass
+    return hash_values(*parts)
+
+
+def cache_path(cache_dir, name, key):
+    """Path of the cache entry of `name` (a table or builder) for `key`."""
+    return os.path.join(cache_dir, f"{name}-{key}{CACHE_EXTENSION}")
+
+
+def read_cached(cache_dir, name, key):
+    """Cached value of `name` for `key`, or None. A hit marks the entry as recently used."""
+    path = cache_path(cache_dir, name, key)
+    try:
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+        os.utime(path)
+        return value
+    except (OSError, EOFError, pickle.UnpicklingError):
+        # Missing, or evicted/half-written by a concurrent writer: recompute
+        return None
+
+
+def write_cached(cache_dir, name, key, value, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """Store a value in the cache, then trim the cache to `max_bytes`."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(cache_dir, name, key)
+
+    # Write aside and rename, so readers never see a partial entry
+    temp_path = f"{path}.{os.getpid()}.{id(value)}.tmp"
+    with open(temp_path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """Delete the least recently used cache entries until the cache fits in `max_bytes`."""
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(CACHE_EXTENSION):
+            try:
+                stat = os.stat(os.path.join(cache_dir, file_name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, file_name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_data import generate_tables, write_tables
+from scripts.transformation.dim_fact_creation import STREAMED_FACTS
+from scripts.transformation.transform import transform_data
+
+SURROGATE_KEY_COLUMNS = ['ProductKey', 'SupplierKey', 'CustomerKey', 'WarehouseKey', 'TimeKey']
+
+
+@pytest.fixture(scope='module')
+def raw_dir(tmp_path_factory):
+    # Synthetic tables come with duplicate and null primary keys injected
+    directory = tmp_path_factory.mktemp('raw')
+    write_tables(generate_tables(3000, seed=1, duplicate_rate=0.05), str(directory))
+    return str(directory)
+
+
+@pytest.mark.parametrize('chunk_size', [500, 1234])
+def test_chunked_facts_equal_in_memory_facts(raw_dir, chunk_size):
+    full, _ = transform_data(raw_dir, None, dict.fromkeys(SURROGATE_KEY_COLUMNS, 0))
+    chunked, _ = transform_data(raw_dir, None, dict.fromkeys(SURROGATE_KEY_COLUMNS, 0), fact_chunk_size=chunk_size)
+
+    for name in STREAMED_FACTS:
+        expected = full[name]
+        actual = pd.concat(list(chunked[name]), ignore_index=True)[list(expected.columns)]
+        columns = list(expected.columns)
+        pd.testing.assert_frame_equal(
+            actual.sort_values(columns).reset_index(drop=True),
+            expected.sort_values(columns).reset_index(drop=True),
+            check_dtype=False,
+        )